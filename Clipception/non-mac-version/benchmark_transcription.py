@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark batched transcription
+Transcribes the same stretch of audio at several batch sizes and reports
+segments/sec and real-time factor, to pick --batch-size for a host. Every
+batch size uses the batched (independent window) decoder, batch size 1
+included; the sequential transcribe() run is shown as a separate baseline.
+"""
+
+import argparse
+import sys
+import time
+
+from transcription import SAMPLE_RATE, check_gpu, decode_audio_window, format_time
+from transcription_backends import BACKENDS, load_backend
+
+def benchmark_batch_sizes(model, samples, batch_sizes, device):
+    """Transcribe samples sequentially, then once per batch size, and return (label, seconds, segments) rows"""
+    rows = []
+    # Sequential decoding conditions on earlier windows and falls back on temperature,
+    # so it is a different algorithm from every batched row and only a reference point
+    start = time.time()
+    result = model.transcribe(samples, language='en', fp16=(device == "cuda"), batched=False)
+    rows.append(('seq', time.time() - start, len(result["segments"])))
+    for batch_size in batch_sizes:
+        start = time.time()
+        result = model.transcribe(samples, language='en', fp16=(device == "cuda"),
+                                  batch_size=batch_size, batched=True)
+        rows.append((batch_size, time.time() - start, len(result["segments"])))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare transcription throughput across batch sizes')
+    parser.add_argument('video_path', help='Path to the video or audio file')
+    parser.add_argument('--model', default='base',
+                      choices=['tiny', 'base', 'small', 'medium', 'large', 'turbo'],
+                      help='Whisper model size to use')
+    parser.add_argument('--backend', default='whisper', choices=BACKENDS, help='Inference engine')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16],
+                      help='Batch sizes to compare')
+    parser.add_argument('--start', type=float, default=0.0, help='Offset in seconds of the audio to use')
+    parser.add_argument('--duration', type=float, default=600.0, help='Seconds of audio to transcribe per run')
+
+    args = parser.parse_args()
+
+    device = check_gpu()
+    samples = decode_audio_window(args.video_path, args.start, args.duration)
+    if len(samples) == 0:
+        print("No audio decoded")
+        sys.exit(1)
+    audio_seconds = len(samples) / SAMPLE_RATE
+    print(f"Benchmarking on {format_time(audio_seconds)} of audio")
+
+    model = load_backend(args.backend, args.model, device)
+
+    # Warm up so the first batch size doesn't pay for lazy initialisation
+    model.transcribe(samples[:SAMPLE_RATE * 30], language='en', fp16=(device == "cuda"))
+
+    rows = benchmark_batch_sizes(model, samples, args.batch_sizes, device)
+
+    print(f"\n{args.backend} {args.model} on {device}:")
+    print(f"{'batch':>6} {'seconds':>9} {'segments':>9} {'segments/s':>11} {'RTF':>7}")
+    for batch_size, seconds, segments in rows:
+        print(f"{batch_size:>6} {seconds:>9.1f} {segments:>9} {segments / seconds:>11.2f} {seconds / audio_seconds:>7.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -2,47 +2,142 @@
 from moviepy.editor import VideoFileClip
 import argparse
 import json
+import subprocess
 import sys
 import os
+import time
 from datetime import datetime
+from timecodes import parse_timestamp
 
-def extract_clip(input_file, output_dir, clip_data):
+def extract_clip(video, output_dir, clip_data):
     """
-    Extract a single clip based on the provided clip data
+    Extract a single clip based on the provided clip data from an already opened VideoFileClip
     """
     try:
         # Create sanitized filename from clip name
         safe_name = "".join(c for c in clip_data["name"] if c.isalnum() or c in (' ', '-', '_')).rstrip()
         output_file = os.path.join(output_dir, f"{safe_name}.mp4")
         
-        # Load the video file
-        video = VideoFileClip(input_file)
-        
         # Check if start and end times are valid numbers
-        start_time = clip_data.get("start")
-        end_time = clip_data.get("end")
+        start_time = parse_timestamp(clip_data.get("start"))
+        end_time = parse_timestamp(clip_data.get("end"))
         
         if start_time is None or end_time is None:
             return False, f"Missing start or end time for clip: {clip_data['name']}"
         
         # Extract the clip using start and end times from JSON
-        clip = video.subclip(start_time, end_time)
+        clip = video.subclip(start_time, min(end_time, video.duration))
         
         # Write the clip to a new file
+        # (the subclip shares the VOD's readers, so it is not closed here; process_clips closes the VOD)
         clip.write_videofile(output_file, codec='libx264')
         
-        # Clean up
-        clip.close()
-        video.close()
-        
         return True, output_file
         
     except Exception as e:
         return False, str(e)
 
-def process_clips(input_file, output_dir, json_file, min_score=0, remove_vod=False):
+def probe_start_time(path):
+    """
+    Container start time in seconds, which ffprobe timestamps include and -ss does not
+    """
+    result = subprocess.run([
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'format=start_time',
+        '-of', 'csv=p=0',
+        path
+    ], capture_output=True, text=True, check=True)
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return 0.0
+
+def find_keyframe_before(input_file, timestamp, search_seconds=30.0, max_search_seconds=600.0, container_start=0.0):
+    """
+    Time of the last video keyframe at or before timestamp, where a stream-copy cut really starts
+
+    timestamp and the result are relative to the container start, like ffmpeg's -ss.
+    The search window doubles until a keyframe turns up; None if there is none
+    within max_search_seconds.
+    """
+    while True:
+        # -read_intervals and the reported frame times are absolute, so shift by the container start
+        result = subprocess.run([
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'v:0',
+            '-skip_frame', 'nokey',
+            '-read_intervals', f"{container_start + max(timestamp - search_seconds, 0):.3f}%{container_start + timestamp + 0.001:.3f}",
+            '-show_entries', 'frame=best_effort_timestamp_time',
+            '-of', 'csv=p=0',
+            input_file
+        ], capture_output=True, text=True, check=True)
+        keyframes = [float(line.strip(', ')) - container_start for line in result.stdout.splitlines() if line.strip(', ') not in ('', 'N/A')]
+        earlier = [keyframe for keyframe in keyframes if keyframe <= timestamp + 0.001]
+        if earlier:
+            return max(earlier)
+        if search_seconds >= min(timestamp, max_search_seconds):
+            return None
+        search_seconds = min(search_seconds * 2, max_search_seconds)
+
+def probe_duration(path):
+    """
+    Container duration of a media file in seconds
+    """
+    result = subprocess.run([
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'csv=p=0',
+        path
+    ], capture_output=True, text=True, check=True)
+    return float(result.stdout.strip())
+
+def extract_clip_fast(input_file, output_dir, clip_data, container_start=0.0):
+    """
+    Cut a clip with ffmpeg stream copy (no re-encode) and measure how far the cut drifted
+
+    Returns (success, output_file or error, (start_drift, end_drift)); drifts are the
+    actual minus the requested start/end in seconds, since copies can only start on keyframes,
+    and None when the keyframe the cut started on couldn't be found.
+    """
+    try:
+        safe_name = "".join(c for c in clip_data["name"] if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        output_file = os.path.join(output_dir, f"{safe_name}.mp4")
+        
+        start_time = parse_timestamp(clip_data.get("start"))
+        end_time = parse_timestamp(clip_data.get("end"))
+        
+        if start_time is None or end_time is None:
+            return False, f"Missing start or end time for clip: {clip_data['name']}", None
+        
+        # Input-side seek jumps straight to the keyframe instead of decoding up to the start
+        subprocess.run([
+            'ffmpeg', '-y', '-v', 'error',
+            '-ss', f"{start_time:.3f}",
+            '-i', input_file,
+            '-t', f"{end_time - start_time:.3f}",
+            '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            output_file
+        ], capture_output=True, text=True, check=True)
+        
+        keyframe = find_keyframe_before(input_file, start_time, container_start=container_start)
+        if keyframe is None:
+            return True, output_file, (None, None)
+        actual_end = keyframe + probe_duration(output_file)
+        
+        return True, output_file, (keyframe - start_time, actual_end - end_time)
+        
+    except subprocess.CalledProcessError as e:
+        return False, (e.stderr or str(e)).strip(), None
+    except Exception as e:
+        return False, str(e), None
+
+def process_clips(input_file, output_dir, json_file, min_score=0, remove_vod=False, fast=False):
     """
     Process all clips from the JSON file that meet the minimum score requirement
+
+    With fast, clips are stream-copied by ffmpeg at keyframes instead of re-encoded,
+    and the summary shows how far each cut drifted from the requested times.
     """
     try:
         # Create output directory if it doesn't exist
@@ -56,29 +151,58 @@ def process_clips(input_file, output_dir, json_file, min_score=0, remove_vod=Fal
         successful_clips = []
         failed_clips = []
         
-        for clip in data.get("top_clips", []):
-            if clip.get("score", 0) >= min_score:
-                success, result = extract_clip(input_file, output_dir, clip)
-                if success:
-                    successful_clips.append((clip["name"], result))
-                else:
-                    failed_clips.append((clip["name"], result))
+        # Probe and open the VOD once; every clip is cut from the same reader
+        # (fast mode hands each cut to ffmpeg and needs no reader)
+        open_start = time.time()
+        video = None if fast else VideoFileClip(input_file)
+        container_start = probe_start_time(input_file) if fast else 0.0
+        open_seconds = time.time() - open_start
+        
+        try:
+            for clip in data.get("top_clips", []):
+                if clip.get("score", 0) >= min_score:
+                    clip_start = time.time()
+                    if fast:
+                        success, result, drift = extract_clip_fast(input_file, output_dir, clip, container_start)
+                    else:
+                        success, result = extract_clip(video, output_dir, clip)
+                        drift = None
+                    if success:
+                        successful_clips.append((clip["name"], result, time.time() - clip_start, drift))
+                    else:
+                        failed_clips.append((clip["name"], result, time.time() - clip_start, drift))
+        finally:
+            if video is not None:
+                video.close()
         
         # Print summary
         print(f"\nExtraction Summary:")
         print(f"Total clips processed: {len(successful_clips) + len(failed_clips)}")
         print(f"Successfully extracted: {len(successful_clips)}")
         print(f"Failed extractions: {len(failed_clips)}")
+        clip_seconds = sum(seconds for _, _, seconds, _ in successful_clips + failed_clips)
+        if fast:
+            print(f"Stream-copied clips in {clip_seconds:.1f}s")
+        else:
+            print(f"VOD opened once in {open_seconds:.1f}s, clips took {clip_seconds:.1f}s")
         
         if successful_clips:
             print("\nSuccessful clips:")
-            for name, path in successful_clips:
-                print(f"- {name}: {path}")
+            for name, path, seconds, drift in successful_clips:
+                if drift is None:
+                    print(f"- {name}: {path} ({seconds:.1f}s)")
+                elif drift[0] is None:
+                    print(f"- {name}: {path} ({seconds:.1f}s, drift unknown: no keyframe found before the start)")
+                else:
+                    print(f"- {name}: {path} ({seconds:.1f}s, start drift {drift[0]:+.2f}s, end drift {drift[1]:+.2f}s)")
+            drifts = [abs(d) for _, _, _, drift in successful_clips if drift is not None for d in drift if d is not None]
+            if drifts:
+                print(f"Largest cut drift: {max(drifts):.2f}s (re-run without --fast for frame-accurate cuts)")
         
         if failed_clips:
             print("\nFailed clips:")
-            for name, error in failed_clips:
-                print(f"- {name}: {error}")
+            for name, error, seconds, _ in failed_clips:
+                print(f"- {name}: {error} ({seconds:.1f}s)")
                 
         if remove_vod and successful_clips:
             try:
@@ -99,10 +223,11 @@ def main():
     parser.add_argument('json_file', help='JSON file containing clip information')
     parser.add_argument('--min-score', type=int, default=0, help='Minimum score threshold for clips (default: 0)')
     parser.add_argument('--remove-vod', action='store_true', help='Remove the original VOD file after successful extraction')
+    parser.add_argument('--fast', action='store_true', help='Stream-copy clips with ffmpeg at keyframes instead of re-encoding (much faster, cuts may drift)')
     
     args = parser.parse_args()
     
-    process_clips(args.input_file, args.output_dir, args.json_file, args.min_score, args.remove_vod)
+    process_clips(args.input_file, args.output_dir, args.json_file, args.min_score, args.remove_vod, args.fast)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,94 @@
+"""
+Sliding-window clip candidates
+Instead of gluing segments into back-to-back blocks, every segment start is
+tried as the start of a window at each candidate length. Windows are scored
+from prefix sums over the segment columns, so the whole transcript is scored
+with a handful of array operations, and the best non-overlapping windows are
+kept as the candidates gpu_clip.py ranks.
+"""
+
+import bisect
+
+import numpy as np
+
+DEFAULT_WINDOW_LENGTHS = (15.0, 30.0, 60.0)
+
+def segment_columns(segments):
+    """start, end, volume, zero crossing rate, spectral centroid and word count arrays of enhanced segments"""
+    starts = np.array([seg["start"] for seg in segments], dtype=np.float64)
+    ends = np.array([seg["end"] for seg in segments], dtype=np.float64)
+    volumes = np.array([seg["audio_features"]["volume"]["value"] for seg in segments], dtype=np.float64)
+    zcrs = np.array([seg["audio_features"]["characteristics"]["zero_crossing_rate"] for seg in segments], dtype=np.float64)
+    centroids = np.array([seg["audio_features"]["characteristics"]["spectral_centroid"] for seg in segments], dtype=np.float64)
+    words = np.array([len(seg["text"].split()) for seg in segments], dtype=np.float64)
+    return starts, ends, volumes, zcrs, centroids, words
+
+def zscore(values):
+    """Standardise values to zero mean and unit variance (all zeros when they are constant)"""
+    std = values.std()
+    if std == 0:
+        return np.zeros_like(values)
+    return (values - values.mean()) / std
+
+def score_windows(starts, ends, volumes, zcrs, centroids, words, length):
+    """Score the window of at least length seconds starting at every segment
+
+    Returns (first, last, score) arrays of segment indices and scores for
+    the windows that fit in the transcript. A window's score sums the
+    z-scores of its duration-weighted volume and spectral centroid and its
+    speech rate in words per second.
+    """
+    durations = np.maximum(ends - starts, 0.0)
+    cum_duration = np.concatenate(([0.0], np.cumsum(durations)))
+    cum_volume = np.concatenate(([0.0], np.cumsum(volumes * durations)))
+    cum_centroid = np.concatenate(([0.0], np.cumsum(centroids * durations)))
+    cum_words = np.concatenate(([0.0], np.cumsum(words)))
+
+    # Last segment of each window: the first one ending at least length seconds after the start
+    first = np.arange(len(starts))
+    last = np.searchsorted(ends, starts + length, side='left')
+    fits = last < len(starts)
+    first, last = first[fits], last[fits]
+    if len(first) == 0:
+        return first, last, np.zeros(0)
+
+    spoken = np.maximum(cum_duration[last + 1] - cum_duration[first], 1e-6)
+    span = np.maximum(ends[last] - starts[first], 1e-6)
+    volume = (cum_volume[last + 1] - cum_volume[first]) / spoken
+    centroid = (cum_centroid[last + 1] - cum_centroid[first]) / spoken
+    speech_rate = (cum_words[last + 1] - cum_words[first]) / span
+
+    score = zscore(volume) + zscore(speech_rate) + 0.5 * zscore(centroid)
+    return first, last, score
+
+def select_candidates(segments, top_n, window_lengths=DEFAULT_WINDOW_LENGTHS):
+    """(first, last, score) of the top_n highest scoring windows that don't overlap, in time order"""
+    if not segments:
+        return []
+
+    columns = segment_columns(segments)
+    starts, ends = columns[0], columns[1]
+
+    scored = [score_windows(*columns, length) for length in window_lengths]
+    first = np.concatenate([f for f, _, _ in scored])
+    last = np.concatenate([l for _, l, _ in scored])
+    score = np.concatenate([s for _, _, s in scored])
+    if len(first) == 0:
+        # Shorter than every window length: the whole transcript is the only candidate
+        return [(0, len(segments) - 1, 0.0)]
+
+    # Greedy non-maximum suppression over a start-sorted list of accepted windows
+    accepted_starts, accepted = [], []
+    for index in np.argsort(-score, kind='stable'):
+        start, end = starts[first[index]], ends[last[index]]
+        position = bisect.bisect_left(accepted_starts, start)
+        if position > 0 and accepted[position - 1][1] > start:
+            continue
+        if position < len(accepted) and accepted[position][0] < end:
+            continue
+        accepted_starts.insert(position, start)
+        accepted.insert(position, (start, end, int(first[index]), int(last[index]), float(score[index])))
+        if len(accepted) >= top_n:
+            break
+
+    return [(first_index, last_index, window_score) for _, _, first_index, last_index, window_score in accepted]
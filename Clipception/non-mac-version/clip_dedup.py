@@ -0,0 +1,63 @@
+"""
+Overlap removal for ranked clips
+Ranked clips are visited best first and kept only if they don't overlap an
+already kept clip by more than max_overlap of the shorter one (non-maximum
+suppression). Kept intervals live in a start-sorted index, so each check
+is a binary search instead of a scan. Clips with unreadable times or
+outside the media are dropped.
+"""
+
+import bisect
+
+from timecodes import parse_timestamp
+
+def clip_interval(clip, media_duration=None):
+    """(start, end) of a clip in seconds, or None if it is invalid or outside the media"""
+    start = parse_timestamp(clip.get("start"))
+    end = parse_timestamp(clip.get("end"))
+    if start is None or end is None or end <= start:
+        return None
+    if media_duration is not None:
+        if start >= media_duration:
+            return None
+        end = min(end, media_duration)
+    return start, end
+
+def _overlap_ratio(a_start, a_end, b_start, b_end):
+    overlap = min(a_end, b_end) - max(a_start, b_start)
+    return overlap / min(a_end - a_start, b_end - b_start) if overlap > 0 else 0.0
+
+def dedupe_clips(clips, media_duration=None, max_overlap=0.5):
+    """Best-first clips with overlapping and out-of-range ones removed
+
+    clips must already be sorted best first. Kept clips get numeric start/end
+    (clamped to media_duration). Returns (kept, suppressed, invalid).
+    """
+    starts, intervals = [], []
+    longest = 0.0
+    kept = []
+    suppressed = invalid = 0
+
+    for clip in clips:
+        interval = clip_interval(clip, media_duration)
+        if interval is None:
+            invalid += 1
+            continue
+        start, end = interval
+
+        # Only kept clips starting within the longest kept length before this one can reach it
+        low = bisect.bisect_right(starts, start - longest)
+        high = bisect.bisect_left(starts, end)
+        neighbours = intervals[low:high]
+        if any(_overlap_ratio(start, end, other_start, other_end) > max_overlap
+               for other_start, other_end in neighbours):
+            suppressed += 1
+            continue
+
+        position = bisect.bisect_left(starts, start)
+        starts.insert(position, start)
+        intervals.insert(position, (start, end))
+        longest = max(longest, end - start)
+        kept.append(dict(clip, start=start, end=end))
+
+    return kept, suppressed, invalid
@@ -0,0 +1,80 @@
+"""
+Local pre-ranking of clip candidates
+Scores every candidate from what the transcript already carries - loudness,
+zero crossing rate, spectral centroid, speech rate, energy spikes against its
+neighbours and hype/laughter keywords - so only the most promising ones are
+sent to the LLM. This bounds the number of API calls per VOD.
+"""
+
+import re
+
+import numpy as np
+
+from clip_candidates import zscore
+
+DEFAULT_KEYWORDS = (
+    'haha', 'lol', 'lmao', 'laugh', 'oh my god', 'omg', 'no way', 'what the', 'insane',
+    'crazy', 'wow', 'let\'s go', 'clip that', 'holy', 'wait', 'yes', 'scream'
+)
+
+# A candidate this many times louder than the median of its neighbours counts as a spike
+SPIKE_RATIO = 1.5
+SPIKE_NEIGHBOURS = 5
+
+def keyword_hits(text, keywords=DEFAULT_KEYWORDS):
+    """Number of keyword occurrences plus exclamation marks in a transcript"""
+    lowered = text.lower()
+    hits = sum(len(re.findall(r'\b' + re.escape(keyword) + r'\b', lowered)) for keyword in keywords)
+    return hits + lowered.count('!')
+
+def score_clips(clips, keywords=DEFAULT_KEYWORDS, columns=None):
+    """Local interest score for each combined segment, higher is better
+
+    columns is the transcript's structured column array (see transcript_store),
+    row for row with clips; the numeric features come from it when given.
+    """
+    if columns is not None:
+        volumes = columns['volume'].astype(np.float64)
+        zcrs = columns['zero_crossing_rate'].astype(np.float64)
+        centroids = columns['spectral_centroid'].astype(np.float64)
+        durations = np.maximum(columns['end'] - columns['start'], 1e-6)
+    else:
+        volumes = np.array([clip["audio_features"]["volume"]["value"] for clip in clips], dtype=np.float64)
+        zcrs = np.array([clip["audio_features"]["characteristics"]["zero_crossing_rate"] for clip in clips], dtype=np.float64)
+        centroids = np.array([clip["audio_features"]["characteristics"]["spectral_centroid"] for clip in clips], dtype=np.float64)
+        durations = np.array([max(clip["end"] - clip["start"], 1e-6) for clip in clips], dtype=np.float64)
+    speech_rates = np.array([len(clip["text"].split()) for clip in clips], dtype=np.float64) / durations
+    hits = np.array([keyword_hits(clip["text"], keywords) for clip in clips], dtype=np.float64)
+
+    # Loudness against the surrounding candidates catches laughs and shouts in quiet streams
+    padded = np.pad(volumes, SPIKE_NEIGHBOURS, mode='edge')
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * SPIKE_NEIGHBOURS + 1)
+    spikes = volumes > SPIKE_RATIO * np.maximum(np.median(windows, axis=1), 1e-6)
+
+    return (
+        zscore(volumes)
+        + zscore(speech_rates)
+        + 0.5 * zscore(zcrs)
+        + 0.5 * zscore(centroids)
+        + 1.0 * spikes
+        + 0.5 * np.log1p(hits)
+    )
+
+def prerank_clips(clips, top_k=None, percentile=None, keywords=DEFAULT_KEYWORDS, columns=None):
+    """Keep the top_k (or top percentile %) candidates by local score, in their original order"""
+    if not clips or (not top_k and not percentile):
+        return clips
+
+    keep = len(clips)
+    if top_k:
+        keep = min(keep, top_k)
+    if percentile:
+        keep = min(keep, max(1, int(np.ceil(len(clips) * percentile / 100.0))))
+
+    if columns is not None and len(columns) != len(clips):
+        print(f"Column file has {len(columns)} rows for {len(clips)} clips, reading features from the transcript")
+        columns = None
+    scores = score_clips(clips, keywords, columns)
+    kept = np.sort(np.argsort(-scores, kind='stable')[:keep])
+    print(f"Pre-ranker kept {keep} of {len(clips)} candidates, dropped {len(clips) - keep} before any LLM call")
+    return [clips[i] for i in kept]
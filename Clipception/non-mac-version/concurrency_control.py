@@ -0,0 +1,161 @@
+"""
+Adaptive concurrency for OpenRouter requests
+An AIMD controller in the style of TCP congestion control: the number of
+requests allowed in flight grows by about one per round trip while calls
+succeed at normal latency, and is cut multiplicatively on errors, slow
+responses and 429s. A Retry-After header pauses new requests until it expires.
+HedgePolicy decides when a slow request gets a duplicate and caps the extra spend.
+"""
+
+import asyncio
+import time
+from collections import deque
+
+def rate_limit_info(error):
+    """(is_rate_limited, retry_after_seconds or None) for an exception raised by the API client"""
+    response = getattr(error, 'response', None)
+    status = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+    retry_after = None
+    headers = getattr(response, 'headers', None)
+    if headers is not None:
+        try:
+            retry_after = float(headers.get('retry-after'))
+        except (TypeError, ValueError):
+            retry_after = None
+    return status == 429, retry_after
+
+class AIMDController:
+    """Async gate whose in-flight limit adapts to latency, errors and rate limits
+
+    With adaptive=False the limit stays fixed but Retry-After pauses still apply.
+    """
+
+    def __init__(self, initial_limit=8, min_limit=1, max_limit=32, adaptive=True,
+                 decrease_factor=0.5, slow_factor=2.0, slow_streak=3, baseline_alpha=0.1,
+                 default_backoff=2.0):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.adaptive = adaptive
+        self.decrease_factor = decrease_factor
+        # slow_streak responses in a row slower than slow_factor times the smoothed
+        # (EWMA) latency count as congestion; a single slow outlier does not
+        self.slow_factor = slow_factor
+        self.slow_streak = slow_streak
+        self.baseline_alpha = baseline_alpha
+        self.default_backoff = default_backoff
+        self.in_flight = 0
+        self.baseline_latency = None
+        self.slow_count = 0
+        self.paused_until = 0.0
+        self.completed = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.started = time.time()
+        self._condition = asyncio.Condition()
+
+    @property
+    def current_limit(self):
+        return max(self.min_limit, int(self.limit))
+
+    @property
+    def requests_per_second(self):
+        elapsed = time.time() - self.started
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    async def acquire(self):
+        """Wait for a free slot and for any rate limit pause to end"""
+        async with self._condition:
+            while True:
+                pause = self.paused_until - time.time()
+                if pause > 0:
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=pause)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self.in_flight < self.current_limit:
+                    self.in_flight += 1
+                    return
+                await self._condition.wait()
+
+    async def release(self, latency, error=None, cancelled=False):
+        """Free a slot and adapt the limit from how the request went
+
+        A cancelled request (e.g. the loser of a hedge) only frees its slot.
+        """
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+            if cancelled:
+                return
+            if error is None:
+                self.completed += 1
+                if self.baseline_latency is None:
+                    self.baseline_latency = latency
+                slow = latency > self.slow_factor * self.baseline_latency
+                self.slow_count = self.slow_count + 1 if slow else 0
+                if not slow:
+                    # Outliers stay out of the baseline so it tracks typical latency
+                    self.baseline_latency += self.baseline_alpha * (latency - self.baseline_latency)
+                if self.slow_count >= self.slow_streak:
+                    self.slow_count = 0
+                    # A sustained rise moves the baseline up too, so it can settle at the new normal
+                    self.baseline_latency = latency
+                    self._decrease(0.9)
+                elif not slow and self.adaptive and self.in_flight + 1 >= self.current_limit:
+                    # Additive increase: about one extra slot per full window of successes
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            else:
+                self.errors += 1
+                rate_limited, retry_after = rate_limit_info(error)
+                if rate_limited:
+                    self.rate_limited += 1
+                    backoff = retry_after if retry_after is not None else self.default_backoff
+                    self.paused_until = max(self.paused_until, time.time() + backoff)
+                self._decrease(self.decrease_factor)
+
+    def _decrease(self, factor):
+        if self.adaptive:
+            self.limit = max(self.min_limit, self.limit * factor)
+
+    def report(self):
+        print(f"Concurrency limit {self.current_limit}, {self.requests_per_second:.2f} requests/s, "
+              f"{self.completed} ok, {self.errors} errors ({self.rate_limited} rate limited)")
+
+class HedgePolicy:
+    """When to send a duplicate of a slow request, and how much duplication is allowed
+
+    A request still unanswered after the given percentile of recently observed
+    latencies is hedged, as long as hedges stay under max_fraction of all
+    requests. Extra spend is tracked as estimated tokens.
+    """
+
+    def __init__(self, percentile=95.0, max_fraction=0.1, min_samples=5, fallback_model=None, window=200):
+        self.percentile = percentile
+        self.max_fraction = max_fraction
+        self.min_samples = min_samples
+        self.fallback_model = fallback_model
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedge_tokens = 0
+
+    def record(self, latency):
+        self.latencies.append(latency)
+
+    def delay(self):
+        """Seconds to wait before hedging, or None until enough latencies are known"""
+        if len(self.latencies) < self.min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100.0))]
+
+    def allow(self):
+        """Whether another hedge fits in the spend cap"""
+        return self.hedges + 1 <= self.max_fraction * max(self.requests, 1)
+
+    def report(self):
+        print(f"Hedged {self.hedges} of {self.requests} requests ({self.hedge_wins} hedges answered first), "
+              f"~{self.hedge_tokens} extra tokens")
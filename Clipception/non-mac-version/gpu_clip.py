@@ -1,17 +1,75 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import argparse
+import asyncio
 import json
+import math
 import os
 import sys
+import threading
 import time
 from typing import List, Dict, Tuple
 import re
 from itertools import islice
 import multiprocessing as mp
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import torch
 import numpy as np
 from tqdm import tqdm
+from transcript_store import NDJSON_SUFFIXES, iter_segments, load_columns
+from clip_prerank import DEFAULT_KEYWORDS, prerank_clips
+from concurrency_control import AIMDController, HedgePolicy, rate_limit_info
+from ranking_cache import RankingCache, chunk_key
+from ranking_journal import RankingJournal, TopKClips
+from clip_dedup import dedupe_clips
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+RANKING_MODEL = "deepseek/deepseek-chat"
+# Cheap first-stage model for --cascade
+SCREEN_MODEL = "meta-llama/llama-3.1-8b-instruct"
+# Bump whenever ranking_request's prompt changes so cached rankings are not reused
+PROMPT_VERSION = 3
+# Rough token accounting for sizing chunks and max_tokens
+CHARS_PER_TOKEN = 4
+# An answer line like {"id": 12, "score": 87}, is ~12 tokens; double it for tokenizer and whitespace variance
+OUTPUT_TOKENS_PER_CLIP = 24
+OUTPUT_TOKENS_OVERHEAD = 200
+DEFAULT_TOKEN_BUDGET = 3000
+# Ranked clips kept per output clip, so overlap removal still leaves --num_clips
+DEDUP_HEADROOM = 3
+
+class RankingStage:
+    """Model and prompt used for one ranking pass, plus its call, token and latency totals."""
+
+    def __init__(self, name: str = "rank", model: str = RANKING_MODEL, screening: bool = False):
+        self.name = name
+        self.model = model
+        self.screening = screening
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def prompt_version(self) -> str:
+        return f"{PROMPT_VERSION}-screen" if self.screening else str(PROMPT_VERSION)
+
+    def prompt(self, clip_table: str) -> str:
+        return screening_prompt(clip_table) if self.screening else ranking_prompt(clip_table)
+
+    def record(self, request: Dict, completion, latency: float) -> None:
+        """Add one finished call, using the API's token usage when it reports it."""
+        usage = getattr(completion, "usage", None)
+        with self._lock:
+            self.calls += 1
+            self.seconds += latency
+            self.prompt_tokens += getattr(usage, "prompt_tokens", None) or estimate_tokens(request["messages"][-1]["content"])
+            self.completion_tokens += getattr(usage, "completion_tokens", None) or 0
+
+    def report(self) -> None:
+        average = self.seconds / self.calls if self.calls else 0.0
+        print(f"Stage {self.name} ({self.model}): {self.calls} calls, {self.prompt_tokens} prompt tokens, "
+              f"{self.completion_tokens} completion tokens, {average:.2f}s average latency")
 
 def setup_gpu():
     """Configure GPU settings."""
@@ -21,40 +79,66 @@ def setup_gpu():
         return True
     return False
 
-def chunk_list(lst: List, chunk_size: int) -> List[List]:
-    """Split a list into chunks of specified size."""
-    return [lst[i:i + chunk_size] for i in range(0, len(lst), chunk_size)]
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text for budgeting requests."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def clip_row(clip_id: int, clip: Dict) -> str:
+    """One clip as a compact table row with rounded features."""
+    features = clip.get("audio_features", {})
+    volume = features.get("volume", {})
+    characteristics = features.get("characteristics", {})
+    text = " ".join(clip.get("text", "").split()).replace("|", "/")
+    return (f"{clip_id}|{clip['start']:.2f}|{clip['end']:.2f}|{volume.get('value', 0):.2f}|"
+            f"{characteristics.get('zero_crossing_rate', 0):.3f}|{characteristics.get('spectral_centroid', 0):.0f}|"
+            f"{characteristics.get('intensity', '')}|{text}")
+
+def format_clip_table(clips: List[Dict]) -> str:
+    """Clips as a header plus one pipe-separated row each, instead of indented JSON."""
+    header = "id|start|end|volume|zcr|centroid|intensity|text"
+    return "\n".join([header] + [clip_row(i, clip) for i, clip in enumerate(clips)])
+
+def chunk_by_token_budget(clips: List[Dict], token_budget: int = DEFAULT_TOKEN_BUDGET, max_clips: int = None,
+                          stage: RankingStage = None) -> List[List[Dict]]:
+    """Split clips into chunks whose prompts stay within token_budget input tokens (and max_clips clips)."""
+    prompt = stage.prompt if stage is not None else ranking_prompt
+    row_budget = max(token_budget - estimate_tokens(prompt("")), 1)
+    chunks = []
+    current, current_tokens = [], 0
+    for clip in clips:
+        tokens = estimate_tokens(clip_row(len(current), clip))
+        if current and (current_tokens + tokens > row_budget or (max_clips and len(current) >= max_clips)):
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(clip)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
 
 def load_clips(json_path: str) -> List[Dict]:
+    """Load combined segments from a JSON list or a compact NDJSON transcript."""
     try:
-        with open(json_path, 'r') as file:
-            return json.load(file)
+        return list(iter_segments(json_path))
     except FileNotFoundError:
         raise FileNotFoundError(f"Clips file not found: {json_path}")
     except json.JSONDecodeError:
         raise ValueError(f"Invalid JSON format in file: {json_path}")
 
-def process_chunk_gpu(chunk_data: Tuple[List[Dict], str, str, str, int]) -> List[Dict]:
-    """Process a single chunk of clips using GPU acceleration."""
-    clips, api_key, site_url, site_name, chunk_id = chunk_data
+def process_chunk_gpu(chunk_data: Tuple[List[Dict], str, str, str, int, RankingStage]) -> List[Dict]:
+    """Process a single chunk of clips using GPU acceleration, raising if it can't be ranked."""
+    clips, api_key, site_url, site_name, chunk_id, stage = chunk_data
     
-    try:
-        # Move data to GPU if available
-        if torch.cuda.is_available():
-            torch.cuda.set_device(0)
-        
-        ranked_results : str = rank_clips_chunk(clips, api_key, site_url, site_name)
-        if ranked_results:
-            parsed_chunk = parse_clip_data(ranked_results)
-            return parsed_chunk
-        return []
-    except Exception as e:
-        print(f"Warning: Failed to process chunk {chunk_id}: {str(e)}")
-        return []
+    # Move data to GPU if available
+    if torch.cuda.is_available():
+        torch.cuda.set_device(0)
+    
+    return rank_clips_chunk(clips, api_key, site_url, site_name, stage=stage)
 
-def rank_clips_chunk(clips: List[Dict], api_key: str, site_url: str = "", site_name: str = "") -> str:
-    client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
+def make_client(api_key: str, site_url: str = "", site_name: str = "", client_class=OpenAI):
+    """OpenRouter client; one instance keeps its HTTP connections alive across calls."""
+    return client_class(
+        base_url=OPENROUTER_BASE_URL,
         api_key=api_key,
         default_headers={
             "HTTP-Referer": site_url,
@@ -62,8 +146,10 @@ def rank_clips_chunk(clips: List[Dict], api_key: str, site_url: str = "", site_n
         }
     )
 
-    prompt = f"""You are an expert content analyzer focusing on viral potential. Analyze these clips:
-{json.dumps(clips, indent=2)}
+def ranking_prompt(clip_table: str) -> str:
+    """Ranking prompt around a format_clip_table listing."""
+    return f"""You are an expert content analyzer focusing on viral potential. Analyze these clips (one per row, times in seconds):
+{clip_table}
 
 For each clip, evaluate using:
 
@@ -78,108 +164,499 @@ For each clip, evaluate using:
 - "Quotable" phrases
 - Discussion potential
 
-For each clip, return ONLY valid JSON following this exact structure:
-{{\"clips\": [{{\"name\": \"[TITLE]\", \"start\": \"[START]\", \"end\": \"[END]\", \"score\": [1-10], \"factors\": \"[Key viral factors]\", \"platforms\": \"[Recommended platforms]\"}}]}}
+Score every clip, referring to it by its id, and return ONLY valid JSON following this exact structure:
+{{\"scores\": [{{\"id\": [ID], \"score\": [1-10]}}]}}
+
+Focus on measurable features in the data. No titles. No commentary. No markdown. Pure JSON only.
+"""
+
+def screening_prompt(clip_table: str) -> str:
+    """Minimal scoring prompt for the cheap first stage of a cascade."""
+    return f"""Score each clip's viral potential from 1 to 10 (one clip per row, times in seconds):
+{clip_table}
 
-Rank clips by viral potential. Focus on measurable features in the data. No commentary. No markdown. Pure JSON only.
+Return ONLY valid JSON: {{\"scores\": [{{\"id\": [ID], \"score\": [1-10]}}]}}
 """
 
+def ranking_request(clips: List[Dict], stage: RankingStage = None) -> Dict:
+    """Keyword arguments of the chat completion that ranks one chunk of clips."""
+    if stage is None:
+        stage = RankingStage()
+    prompt = stage.prompt(format_clip_table(clips))
+
+    return {
+        "model": stage.model,
+        "messages": [
+            {
+                "role": "system",
+                "content": "You are a helpful assistant that ranks video clips. Keep explanations brief and focused on virality potential. Follow the JSON format exactly."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        "response_format": {
+            'type': 'json_object'
+        },
+        "temperature": 1,
+        # Room for every clip's answer so large chunks aren't cut off mid-JSON
+        "max_tokens": OUTPUT_TOKENS_PER_CLIP * len(clips) + OUTPUT_TOKENS_OVERHEAD
+    }
+
+def rank_clips_chunk(clips: List[Dict], api_key: str, site_url: str = "", site_name: str = "", client: OpenAI = None,
+                     stage: RankingStage = None) -> List[Dict]:
+    """Rank one chunk, retrying failed calls and unusable answers."""
+    if client is None:
+        client = make_client(api_key, site_url, site_name)
+    if stage is None:
+        stage = RankingStage()
+    request = ranking_request(clips, stage)
+
     max_retries = 3
     retry_delay = 2
 
     for attempt in range(max_retries):
         try:
-            completion = client.chat.completions.create(
-                model="deepseek/deepseek-chat",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant that ranks video clips. Keep explanations brief and focused on virality potential. Follow the JSON format exactly."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                response_format = {
-                    'type': 'json_object'
-                },
-                temperature=1,
-                max_tokens=1000
-            )
-            
-            if completion and completion.choices:
-                return completion.choices[0].message.content
-            
+            request_start = time.time()
+            completion = client.chat.completions.create(**request)
+            stage.record(request, completion, time.time() - request_start)
+            content = completion.choices[0].message.content if completion and completion.choices else ""
+            # A truncated or malformed answer raises here and is retried like a failed call
+            return parse_clip_data(content, clips)
+
         except Exception as e:
             if attempt < max_retries - 1:
-                print(f"Attempt {attempt + 1} failed. Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
+                # Honour the server's Retry-After on 429s instead of the fixed backoff
+                _, retry_after = rate_limit_info(e)
+                delay = max(retry_delay, retry_after or 0)
+                print(f"Attempt {attempt + 1} failed. Retrying in {delay} seconds...")
+                time.sleep(delay)
                 retry_delay *= 2
             else:
                 raise Exception(f"Failed to rank clips after {max_retries} attempts: {str(e)}")
-    
-    return None
+
+def split_cached_chunks(chunks: List[List[Dict]], cache: RankingCache = None, stage: RankingStage = None,
+                        journal: RankingJournal = None) -> Tuple[List[Dict], List[Tuple[int, List[Dict], str]]]:
+    """Clips already ranked in the journal or cache, and (chunk_id, chunk, key) for the chunks still to send."""
+    if stage is None:
+        stage = RankingStage()
+    cached_clips = []
+    pending = []
+    for chunk_id, chunk in enumerate(chunks):
+        key = chunk_key(stage.model, stage.prompt_version, chunk)
+        cached = journal.get(key) if journal is not None else None
+        if cached is None and cache is not None:
+            cached = cache.get(key)
+        if cached is None:
+            pending.append((chunk_id, chunk, key))
+        else:
+            cached_clips.extend(cached)
+    return cached_clips, pending
+
+def store_chunk_result(key: str, chunk_id: int, result: List[Dict], stage: RankingStage, top: TopKClips,
+                       cache: RankingCache = None, journal: RankingJournal = None) -> None:
+    """Push one chunk's ranked clips into the top-K heap, the journal and the cache as soon as it finishes."""
+    top.extend(result)
+    if not result:
+        return
+    if journal is not None:
+        journal.append(key, chunk_id, stage.name, result)
+    if cache is not None:
+        cache.put(key, result)
 
 def rank_all_clips_parallel(clips: List[Dict], api_key: str, site_url: str = "", site_name: str = "", 
-                          chunk_size: int = 5, num_processes: int = None) -> List[Dict]:
-    """Rank clips in parallel using multiple processes and GPU acceleration."""
+                          chunk_size: int = None, num_processes: int = None, cache: RankingCache = None,
+                          token_budget: int = DEFAULT_TOKEN_BUDGET, stage: RankingStage = None,
+                          top: TopKClips = None, journal: RankingJournal = None, max_attempts: int = 3,
+                          failed: List[Dict] = None) -> List[Dict]:
+    """Rank clips in parallel using multiple processes and GPU acceleration.
+
+    A chunk that fails is resubmitted until it has been tried max_attempts
+    times; the clips of chunks that never succeed are added to failed.
+    Only the clips kept by top (all of them by default) are returned, best first.
+    """
     if num_processes is None:
         num_processes = mp.cpu_count()
+    if stage is None:
+        stage = RankingStage()
+    if top is None:
+        top = TopKClips()
 
-    chunks = chunk_list(clips, chunk_size)
-    chunk_data = [(chunk, api_key, site_url, site_name, i) for i, chunk in enumerate(chunks)]
-    
-    all_ranked_clips = []
+    chunks = chunk_by_token_budget(clips, token_budget, chunk_size, stage)
+    cached_clips, pending = split_cached_chunks(chunks, cache, stage, journal)
+    top.extend(cached_clips)
+    failed_chunks = []
     
     # Setup progress bar
     pbar = tqdm(total=len(chunks), desc="Processing chunks")
+    pbar.update(len(chunks) - len(pending))
     
     # Use ThreadPoolExecutor for parallel API calls
     with ThreadPoolExecutor(max_workers=num_processes) as executor:
-        futures = [executor.submit(process_chunk_gpu, data) for data in chunk_data]
+        def submit(chunk_id, chunk, key, attempt):
+            future = executor.submit(process_chunk_gpu, (chunk, api_key, site_url, site_name, chunk_id, stage))
+            futures[future] = (chunk_id, chunk, key, attempt)
+
+        futures = {}
+        for chunk_id, chunk, key in pending:
+            submit(chunk_id, chunk, key, 1)
         
-        for future in futures:
-            try:
-                result = future.result()
-                all_ranked_clips.extend(result)
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk_id, chunk, key, attempt = futures.pop(future)
+                try:
+                    store_chunk_result(key, chunk_id, future.result(), stage, top, cache, journal)
+                except Exception as e:
+                    if attempt < max_attempts:
+                        print(f"Chunk {chunk_id} attempt {attempt} failed ({str(e)}), resubmitting")
+                        submit(chunk_id, chunk, key, attempt + 1)
+                        continue
+                    print(f"Warning: Failed to process chunk {chunk_id} after {attempt} attempts: {str(e)}")
+                    failed_chunks.append(chunk_id)
+                    if failed is not None:
+                        failed.extend(chunk)
                 pbar.update(1)
-            except Exception as e:
-                print(f"Warning: Chunk processing failed: {str(e)}")
     
     pbar.close()
+    if failed_chunks:
+        print(f"Warning: {len(failed_chunks)} chunks could not be ranked: {sorted(failed_chunks)}")
     
-    # Final sorting of all clips
-    return sorted(all_ranked_clips, key=lambda x: x.get('score', 0), reverse=True)
+    return top.drain()
 
-def parse_clip_data(input_string: str) -> list[dict]:
-    if not input_string:
-        return []
-    cleaned_str = input_string.replace("```json", "").replace("```", "").strip()
+async def send_request_async(client: AsyncOpenAI, request: Dict, controller: AIMDController = None,
+                             hedge: HedgePolicy = None, stage: RankingStage = None) -> str:
+    """Send one chat completion, releasing the controller slot it was sent under with its latency or error."""
+    request_start = time.time()
     try:
-        clips = json.loads(cleaned_str)["clips"]
-
-        # Filter out invalid clip structures
-        clips = [
-            clip
-            for clip in clips
-            if all(
-                key in clip
-                for key in ("name", "start", "end", "score", "factors", "platforms")
-            )
-        ]
+        completion = await client.chat.completions.create(**request)
+    except asyncio.CancelledError:
+        elapsed = time.time() - request_start
+        if controller is not None:
+            await controller.release(elapsed, cancelled=True)
+        if hedge is not None:
+            # A primary cancelled after its hedge won is the slow tail; its elapsed time is a lower bound
+            hedge.record(elapsed)
+        raise
+    except Exception as e:
+        if controller is not None:
+            await controller.release(time.time() - request_start, e)
+        raise
+    latency = time.time() - request_start
+    if stage is not None:
+        stage.record(request, completion, latency)
+    if controller is not None:
+        await controller.release(latency)
+    if hedge is not None:
+        hedge.record(latency)
+
+    if completion and completion.choices:
+        return completion.choices[0].message.content
+    return None
+
+async def rank_clips_chunk_async(client: AsyncOpenAI, clips: List[Dict], controller: AIMDController,
+                                 hedge: HedgePolicy = None, stage: RankingStage = None) -> str:
+    """One ranking request on a shared async client, hedged with a duplicate if it runs slow."""
+    request = ranking_request(clips, stage)
+    await controller.acquire()
+    if hedge is None:
+        return await send_request_async(client, request, controller, stage=stage)
+
+    hedge.requests += 1
+    primary = asyncio.create_task(send_request_async(client, request, controller, hedge, stage))
+    delay = hedge.delay()
+    if delay is None:
+        return await primary
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done or not hedge.allow():
+        return await primary
+
+    # The duplicate skips the concurrency queue; the spend cap bounds how many there are
+    hedge.hedges += 1
+    hedge_request = dict(request, model=hedge.fallback_model or request["model"])
+    hedge.hedge_tokens += estimate_tokens(request["messages"][-1]["content"]) + request["max_tokens"]
+    secondary = asyncio.create_task(send_request_async(client, hedge_request, stage=stage))
+
+    pending = {primary, secondary}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is secondary:
+                        hedge.hedge_wins += 1
+                    return task.result()
+        # Both failed: surface the original request's error
+        return primary.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def rank_all_clips_async(clips: List[Dict], api_key: str, site_url: str = "", site_name: str = "",
+                               chunk_size: int = None, concurrency: int = 8, adaptive: bool = False,
+                               max_concurrency: int = 32, max_attempts: int = 5,
+                               cache: RankingCache = None, token_budget: int = DEFAULT_TOKEN_BUDGET,
+                               hedge: HedgePolicy = None, stage: RankingStage = None,
+                               top: TopKClips = None, journal: RankingJournal = None,
+                               failed: List[Dict] = None) -> List[Dict]:
+    """Rank clips with one keep-alive client, starting at concurrency requests in flight.
+
+    With adaptive, the limit grows up to max_concurrency while requests are
+    healthy and backs off on errors and 429s. A failed chunk goes back on
+    the queue until it has been tried max_attempts times; the clips of chunks
+    that never succeed are added to failed. Only the clips kept by top (all
+    of them by default) are returned, best first.
+    """
+    if stage is None:
+        stage = RankingStage()
+    if top is None:
+        top = TopKClips()
+    chunks = chunk_by_token_budget(clips, token_budget, chunk_size, stage)
+    client = make_client(api_key, site_url, site_name, client_class=AsyncOpenAI)
+    controller = AIMDController(concurrency, max_limit=max(concurrency, max_concurrency), adaptive=adaptive)
+
+    cached_clips, pending = split_cached_chunks(chunks, cache, stage, journal)
+    top.extend(cached_clips)
+    queue = asyncio.Queue()
+    for chunk_id, chunk, key in pending:
+        queue.put_nowait((chunk_id, chunk, key, 1))
+    remaining = len(pending)
+    failed_chunks = []
+    pbar = tqdm(total=len(chunks), desc="Processing chunks")
+    pbar.update(len(chunks) - len(pending))
+
+    async def process_chunk(chunk_id: int, chunk: List[Dict], key: str, attempt: int) -> None:
+        nonlocal remaining
+        try:
+            ranked_results = await rank_clips_chunk_async(client, chunk, controller, hedge, stage)
+            # Raises on a truncated or malformed answer, so the chunk is requeued instead of stored empty
+            result = parse_clip_data(ranked_results, chunk)
+            store_chunk_result(key, chunk_id, result, stage, top, cache, journal)
+        except Exception as e:
+            if attempt < max_attempts:
+                print(f"Chunk {chunk_id} attempt {attempt} failed ({str(e)}), requeueing")
+                queue.put_nowait((chunk_id, chunk, key, attempt + 1))
+                return
+            print(f"Warning: Failed to process chunk {chunk_id} after {attempt} attempts: {str(e)}")
+            failed_chunks.append(chunk_id)
+            if failed is not None:
+                failed.extend(chunk)
+        remaining -= 1
+        pbar.update(1)
+        if remaining == 0:
+            queue.put_nowait(None)
 
-        return clips
-    except (json.JSONDecodeError, ValueError) as e:
+    tasks = []
+    try:
+        while remaining:
+            item = await queue.get()
+            if item is None:
+                break
+            tasks.append(asyncio.create_task(process_chunk(*item)))
+        await asyncio.gather(*tasks)
+    finally:
+        pbar.close()
+        await client.close()
+
+    if pending:
+        controller.report()
+        if hedge is not None:
+            hedge.report()
+    if failed_chunks:
+        print(f"Warning: {len(failed_chunks)} chunks could not be ranked: {sorted(failed_chunks)}")
+
+    return top.drain()
+
+def rank_cascade(clips: List[Dict], rank, screen_stage: RankingStage, final_stage: RankingStage,
+                 screen_top: TopKClips, top: TopKClips = None) -> List[Dict]:
+    """Score every clip with the cheap screen_stage, then re-score the ones screen_top keeps with final_stage.
+
+    rank(clips, stage, top, failed) runs one ranking pass, threaded or async,
+    adding the clips of chunks it could not rank to failed. Finalists keep the
+    final stage's score and record the screening one as screen_score; only
+    finalists the final stage failed on fall back to their screening score,
+    following in screening order.
+    """
+    screened = rank(clips, screen_stage, screen_top)
+
+    # Re-send the original segments, in time order, so the strong model sees the full features
+    sources = {(clip["start"], clip["end"]): clip for clip in clips}
+    finalists = sorted((sources[(clip["start"], clip["end"])] for clip in screened), key=lambda clip: clip["start"])
+    print(f"Cascade: {len(finalists)} of {screen_top.total} screened clips go to {final_stage.model}")
+    failed = []
+    final = rank(finalists, final_stage, top, failed)
+
+    screen_scores = {(clip["start"], clip["end"]): clip["score"] for clip in screened}
+    for clip in final:
+        clip["screen_score"] = screen_scores.get((clip["start"], clip["end"]))
+    # Finalists the final stage scored but top dropped ranked low and stay out
+    failed_keys = {(clip["start"], clip["end"]) for clip in failed}
+    return final + [dict(clip, screen_score=clip["score"]) for clip in screened
+                    if (clip["start"], clip["end"]) in failed_keys]
+
+def parse_json_response(input_string: str):
+    """Decode a model's JSON answer, tolerating markdown code fences."""
+    return json.loads(input_string.replace("```json", "").replace("```", "").strip())
+
+def parse_clip_data(input_string: str, chunk: List[Dict]) -> list[dict]:
+    """Turn an id/score answer into ranked clips, taking times and text from the chunk it scored.
+
+    Raises ValueError when the answer is empty, malformed or scores none of the chunk's clips.
+    """
+    if not input_string:
+        raise ValueError("Empty ranking response")
+    try:
+        scores = parse_json_response(input_string)["scores"]
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
         print(f"Error parsing clip data: {e}. Input string: {input_string}")
+        raise ValueError(f"Unparseable ranking response: {e}") from e
 
-        return []
+    clips = {}
+    for entry in scores:
+        try:
+            clip_id = int(entry["id"])
+            score = float(entry["score"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if not 0 <= clip_id < len(chunk) or clip_id in clips:
+            continue
+        source = chunk[clip_id]
+        # Titles, factors and platforms are filled in by describe_top_clips for the final top clips
+        clips[clip_id] = {
+            "name": "",
+            "start": source["start"],
+            "end": source["end"],
+            "score": score,
+            "factors": "",
+            "platforms": "",
+            "text": source.get("text", "")
+        }
+    if not clips:
+        raise ValueError(f"Ranking response scored none of the chunk's {len(chunk)} clips")
+    return list(clips.values())
+
+def describe_top_clips(clips: List[Dict], api_key: str, site_url: str = "", site_name: str = "",
+                       model: str = RANKING_MODEL) -> int:
+    """Title the final top clips and name their viral factors and platforms in one API call."""
+    if not clips:
+        return 0
+
+    client = make_client(api_key, site_url, site_name)
+
+    listing = "\n".join(
+        f"{i}|{clip['start']:.0f}-{clip['end']:.0f}s|{' '.join(clip.get('text', '').split())}"
+        for i, clip in enumerate(clips)
+    )
+    prompt = f"""For each viral clip below (id|time|transcript), write a short, catchy social media title, its key viral factors and the platforms it suits best:
+{listing}
+
+Return ONLY valid JSON following this exact structure:
+{{\"clips\": [{{\"id\": [ID], \"name\": \"[TITLE]\", \"factors\": \"[Key viral factors]\", \"platforms\": \"[Recommended platforms]\"}}]}}
+"""
+
+    described = 0
+    try:
+        completion = client.chat.completions.create(
+            model=model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are a helpful assistant that titles video clips. Keep explanations brief and focused on virality potential. Follow the JSON format exactly."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            response_format = {
+                'type': 'json_object'
+            },
+            temperature=1,
+            max_tokens=60 * len(clips) + 100
+        )
+        content = completion.choices[0].message.content if completion and completion.choices else ""
+        entries = parse_json_response(content)["clips"]
+    except Exception as e:
+        print(f"Warning: Failed to describe top clips: {str(e)}")
+        entries = []
 
-def save_top_clips_json(clips: List[Dict], output_file: str, num_clips: int = 20) -> None:
+    for entry in entries:
+        try:
+            clip = clips[int(entry["id"])]
+        except (KeyError, TypeError, ValueError, IndexError):
+            continue
+        if entry.get("name"):
+            clip["name"] = entry["name"]
+            described += 1
+        clip["factors"] = entry.get("factors", clip["factors"])
+        clip["platforms"] = entry.get("platforms", clip["platforms"])
+
+    # clip.py names output files after the title, so never leave one empty
+    for clip in clips:
+        if not clip["name"]:
+            clip["name"] = f"Clip {clip['start']:.0f}s"
+    return described
+
+def retitle_clips(clips: List[Dict], api_key: str, site_url: str = "", site_name: str = "",
+                  model: str = RANKING_MODEL) -> int:
+    """Rewrite clip names from their refined transcripts (two-pass mode) in one API call."""
+    refined = [(i, clip) for i, clip in enumerate(clips) if clip.get("transcript")]
+    if not refined:
+        return 0
+
+    client = make_client(api_key, site_url, site_name)
+
+    listing = "\n".join(f"{i}: {clip['transcript']}" for i, clip in refined)
+    prompt = f"""Write a short, catchy social media title for each clip transcript below (id: transcript):
+{listing}
+
+Return ONLY valid JSON following this exact structure:
+{{\"titles\": [{{\"id\": [ID], \"name\": \"[TITLE]\"}}]}}
+"""
+
+    # On any failure the clips keep their draft names and are still extracted
+    try:
+        completion = client.chat.completions.create(
+            model=model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are a helpful assistant that titles video clips. Follow the JSON format exactly."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            response_format = {
+                'type': 'json_object'
+            },
+            temperature=1,
+            max_tokens=1000
+        )
+        content = completion.choices[0].message.content if completion and completion.choices else ""
+        titles = parse_json_response(content)["titles"]
+    except Exception as e:
+        print(f"Warning: Failed to retitle clips, keeping draft names: {str(e)}")
+        return 0
+
+    renamed = 0
+    for title in titles:
+        try:
+            index = int(title["id"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= index < len(clips) and clips[index].get("transcript") and title.get("name"):
+            clips[index]["name"] = title["name"]
+            renamed += 1
+    return renamed
+
+def save_top_clips_json(clips: List[Dict], output_file: str, num_clips: int = 20, total_clips: int = None) -> None:
     top_clips = clips[:num_clips]
     output_data = {
         'top_clips': top_clips,
-        'total_clips': len(clips),
+        'total_clips': len(clips) if total_clips is None else total_clips,
         'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
     }
     
@@ -196,8 +673,30 @@ def main():
     parser.add_argument('--site_url', default='http://localhost', help='Site URL for OpenRouter API')
     parser.add_argument('--site_name', default='Local Test', help='Site name for OpenRouter API')
     parser.add_argument('--num_clips', type=int, default=20, help='Number of top clips to extract')
-    parser.add_argument('--chunk_size', type=int, default=5, help='Number of clips to process per API call')
+    parser.add_argument('--chunk_size', type=int, default=None, help='Maximum number of clips per API call (default: only limited by --token_budget)')
+    parser.add_argument('--token_budget', type=int, default=DEFAULT_TOKEN_BUDGET, help='Estimated input tokens per API call used to size chunks')
     parser.add_argument('--num_processes', type=int, default=None, help='Number of parallel processes (default: CPU count)')
+    parser.add_argument('--async_rank', action='store_true', help='Rank with asyncio on one pooled HTTP client instead of a thread pool')
+    parser.add_argument('--concurrency', type=int, default=8, help='Maximum (or, with --adaptive, initial) in-flight API requests with --async_rank')
+    parser.add_argument('--adaptive', action='store_true', help='With --async_rank, grow or shrink in-flight requests from latency, errors and 429s')
+    parser.add_argument('--max_concurrency', type=int, default=32, help='Upper bound for --adaptive concurrency')
+    parser.add_argument('--hedge', action='store_true', help='With --async_rank, duplicate requests that run slower than --hedge_percentile of observed latency')
+    parser.add_argument('--hedge_percentile', type=float, default=95.0, help='Latency percentile after which a request is hedged')
+    parser.add_argument('--hedge_max_fraction', type=float, default=0.1, help='Cap on hedged requests as a fraction of all requests')
+    parser.add_argument('--hedge_model', default=None, help='Model for hedge requests (default: the ranking model)')
+    parser.add_argument('--cascade', action='store_true', help='Screen all clips with --screen_model, then re-score the top --cascade_fraction with --final_model')
+    parser.add_argument('--screen_model', default=SCREEN_MODEL, help='Cheap first-stage model for --cascade')
+    parser.add_argument('--final_model', default=RANKING_MODEL, help='Model that produces the final scores')
+    parser.add_argument('--cascade_fraction', type=float, default=0.2, help='Fraction of screened clips re-scored by --final_model')
+    parser.add_argument('--max_overlap', type=float, default=0.5, help='Drop a clip overlapping a better one by more than this fraction of the shorter clip')
+    parser.add_argument('--media_duration', type=float, default=None, help='Media length in seconds; later clips are dropped (default: end of the transcript)')
+    parser.add_argument('--no_dedup', action='store_true', help='Keep overlapping and out-of-range clips')
+    parser.add_argument('--journal', default=None, help='Journal of finished chunks (default: <output_file>.journal.jsonl), removed after a successful run')
+    parser.add_argument('--no_cache', '--no-cache', action='store_true', help='Always call the API, ignoring and not updating the ranking cache')
+    parser.add_argument('--prerank_top_k', type=int, default=None, help='Only send the K best candidates by local audio/text score to the LLM')
+    parser.add_argument('--prerank_percentile', type=float, default=None, help='Only send the top percent of candidates by local score to the LLM')
+    parser.add_argument('--keywords', default=None, help='Comma-separated extra keywords for the local pre-ranker')
+    parser.add_argument('--retitle', action='store_true', help='Treat clips_json as a refined top clips file and rewrite its titles in place')
     
     args = parser.parse_args()
     
@@ -215,17 +714,94 @@ def main():
         if not api_key:
             raise ValueError("Please set the OPEN_ROUTER_KEY environment variable")
         
+        if args.retitle:
+            with open(args.clips_json, 'r') as f:
+                data = json.load(f)
+            renamed = retitle_clips(data.get('top_clips', []), api_key, args.site_url, args.site_name,
+                                    model=args.final_model)
+            partial_path = args.clips_json + '.part'
+            with open(partial_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(partial_path, args.clips_json)
+            print(f"\nRetitled {renamed} clips in {args.clips_json}")
+            print(f"Total processing time: {time.time() - start_time:.2f} seconds")
+            return
+        
         clips = load_clips(args.clips_json)
-        ranked_clips = rank_all_clips_parallel(
-            clips, 
-            api_key, 
-            args.site_url, 
-            args.site_name, 
-            args.chunk_size,
-            args.num_processes
-        )
+        media_duration = args.media_duration or max((clip["end"] for clip in clips), default=None)
+        keywords = DEFAULT_KEYWORDS
+        if args.keywords:
+            keywords += tuple(keyword.strip().lower() for keyword in args.keywords.split(',') if keyword.strip())
+        columns = None
+        if (args.prerank_top_k or args.prerank_percentile) and args.clips_json.endswith(NDJSON_SUFFIXES):
+            # The memory-mapped column file feeds the pre-ranker's numeric features
+            columns = load_columns(args.clips_json)
+        clips = prerank_clips(clips, args.prerank_top_k, args.prerank_percentile, keywords, columns)
+        cache = None if args.no_cache else RankingCache()
+        
+        def rank(stage_clips: List[Dict], stage: RankingStage, top: TopKClips, failed: List[Dict] = None) -> List[Dict]:
+            if args.async_rank:
+                return asyncio.run(rank_all_clips_async(
+                    stage_clips,
+                    api_key,
+                    args.site_url,
+                    args.site_name,
+                    args.chunk_size,
+                    args.concurrency,
+                    args.adaptive,
+                    args.max_concurrency,
+                    cache=cache,
+                    token_budget=args.token_budget,
+                    hedge=HedgePolicy(args.hedge_percentile, args.hedge_max_fraction, fallback_model=args.hedge_model) if args.hedge else None,
+                    stage=stage,
+                    top=top,
+                    journal=journal,
+                    failed=failed
+                ))
+            return rank_all_clips_parallel(
+                stage_clips, 
+                api_key, 
+                args.site_url, 
+                args.site_name, 
+                args.chunk_size,
+                args.num_processes,
+                cache,
+                args.token_budget,
+                stage,
+                top,
+                journal,
+                failed=failed
+            )
+        
+        # Finished chunks are journaled next to the output so a crashed run can pick up where it stopped
+        journal = RankingJournal(args.journal or f"{args.output_file}.journal.jsonl")
+        top = TopKClips(args.num_clips if args.no_dedup else args.num_clips * DEDUP_HEADROOM)
+        final_stage = RankingStage("final" if args.cascade else "rank", args.final_model)
+        if args.cascade:
+            screen_stage = RankingStage("screen", args.screen_model, screening=True)
+            screen_top = TopKClips(max(1, math.ceil(len(clips) * args.cascade_fraction)))
+            ranked_clips = rank_cascade(clips, rank, screen_stage, final_stage, screen_top, top)
+            total_clips = screen_top.total
+            screen_stage.report()
+        else:
+            ranked_clips = rank(clips, final_stage, top)
+            total_clips = top.total
+        final_stage.report()
+        
+        if cache is not None:
+            cache.report()
+            cache.close()
+        
+        if not args.no_dedup:
+            ranked_clips, suppressed, invalid = dedupe_clips(ranked_clips, media_duration, args.max_overlap)
+            print(f"Removed {suppressed} overlapping and {invalid} out-of-range clips")
+        
+        described = describe_top_clips(ranked_clips[:args.num_clips], api_key, args.site_url, args.site_name,
+                                       model=final_stage.model)
+        print(f"Described {described} of the top {min(args.num_clips, len(ranked_clips))} clips")
         
-        save_top_clips_json(ranked_clips, args.output_file, args.num_clips)
+        save_top_clips_json(ranked_clips, args.output_file, args.num_clips, total_clips)
+        journal.clear()
         
         print(f"\nSuccessfully saved top {args.num_clips} clips to {args.output_file}")
         print(f"Total processing time: {time.time() - start_time:.2f} seconds")
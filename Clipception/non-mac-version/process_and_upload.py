@@ -13,6 +13,7 @@ from pathlib import Path
 import re
 import yt_dlp
 import argparse
+from transcription_client import try_server_transcription
 
 # Add TikTok uploader to path
 sys.path.append('/Users/alexfreedman/simpleclipper/TiktokAutoUploader')
@@ -101,8 +102,12 @@ def run_script(command):
         print(f"Error: {str(e)}")
         return False
 
-def process_video_to_clips(video_path):
-    """Process video and generate clips"""
+def process_video_to_clips(video_path, two_pass=False, refine_model="medium"):
+    """Process video and generate clips
+
+    With two_pass, a tiny-model draft transcript drives ranking and only the
+    selected clip windows are re-transcribed with refine_model.
+    """
     print("🎬 Starting video processing pipeline...")
     
     # Sanitize filename if needed
@@ -127,8 +132,10 @@ def process_video_to_clips(video_path):
 
     # Step 1: Run enhanced transcription
     print("\nStep 1: Generating enhanced transcription...")
-    cmd1 = f"python transcription.py \"{feature_transcribe_path}\""
-    if not run_script(cmd1):
+    draft_model = "tiny" if two_pass else "base"
+    # Only runs after try_server_transcription failed, so skip the server instead of retrying it
+    cmd1 = f"python transcription.py \"{feature_transcribe_path}\" --model {draft_model} --no-server"
+    if not try_server_transcription(feature_transcribe_path, model_size=draft_model) and not run_script(cmd1):
         return None
 
     transcription_json = os.path.join(output_dir, f"{base_name}.enhanced_transcription.json")
@@ -143,7 +150,7 @@ def process_video_to_clips(video_path):
             f"--site_url 'http://localhost' "
             f"--site_name 'Local Test' "
             f"--num_clips 20 "
-            f"--chunk_size 5")
+            f"--token_budget 3000")
     if not run_script(cmd2):
         return None
 
@@ -152,6 +159,17 @@ def process_video_to_clips(video_path):
         print(f"Error: Expected top clips file {clips_json} was not generated")
         return None
 
+    if two_pass:
+        # Step 2b: Re-transcribe just the chosen clips and retitle them from the refined text
+        print(f"\nStep 2b: Refining clip transcripts with the {refine_model} model...")
+        cmd_refine = (f"python transcription.py \"{feature_transcribe_path}\" "
+                      f"--refine-clips \"{clips_json}\" --model {refine_model}")
+        # The first-pass clips and titles are still usable, so a failed refinement doesn't stop extraction
+        if not run_script(cmd_refine):
+            print("Warning: Clip refinement failed, extracting clips with first-pass titles")
+        elif not run_script(f"python gpu_clip.py \"{clips_json}\" --retitle"):
+            print("Warning: Retitling failed, extracting clips with first-pass titles")
+
     # Step 3: Extract video clips
     print("\nStep 3: Extracting video clips...")
     clips_output_dir = os.path.join(output_dir, "clips")
@@ -230,6 +248,8 @@ def main():
     parser.add_argument('input', help='Video file path or URL (Twitch VOD, YouTube, etc.)')
     parser.add_argument('--tiktok-user', required=True, help='TikTok username (must be logged in first)')
     parser.add_argument('--max-uploads', type=int, default=3, help='Maximum number of clips to upload (default: 3)')
+    parser.add_argument('--two-pass', action='store_true', help='Rank on a tiny-model draft transcript and re-transcribe only the chosen clips')
+    parser.add_argument('--refine-model', default='medium', help='Whisper model for the two-pass refinement (default: medium)')
     parser.add_argument('--base-title', default='', help='Base title for TikTok posts')
     
     args = parser.parse_args()
@@ -265,7 +285,7 @@ def main():
     
     try:
         # Process video to generate clips
-        result = process_video_to_clips(video_path)
+        result = process_video_to_clips(video_path, args.two_pass, args.refine_model)
         if not result:
             print("❌ Failed to process video")
             sys.exit(1)
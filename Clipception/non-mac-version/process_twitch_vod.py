@@ -5,6 +5,7 @@ from pathlib import Path
 import re
 import yt_dlp
 import time
+from transcription_client import try_server_transcription
 
 def sanitize_filename(filename):
     """Convert filename to safe string without spaces"""
@@ -154,8 +155,9 @@ def main():
 
         # Step 1: Run enhanced transcription
         print("\nStep 1: Generating enhanced transcription...")
-        cmd1 = f"python transcription.py \"{feature_transcribe_path}\""
-        if not run_script(cmd1):
+        # Only runs after try_server_transcription failed, so skip the server instead of retrying it
+        cmd1 = f"python transcription.py \"{feature_transcribe_path}\" --no-server"
+        if not try_server_transcription(feature_transcribe_path) and not run_script(cmd1):
             sys.exit(1)
 
         transcription_json = os.path.join(output_dir, f"{base_name}.enhanced_transcription.json")
@@ -170,7 +172,7 @@ def main():
                 f"--site_url 'http://localhost' "
                 f"--site_name 'Local Test' "
                 f"--num_clips 20 "
-                f"--chunk_size 5")
+                f"--token_budget 3000")
         if not run_script(cmd2):
             sys.exit(1)
 
@@ -0,0 +1,94 @@
+"""
+Persistent cache of LLM clip rankings
+Parsed clips from each ranking call are stored in SQLite, keyed by the model,
+the prompt template version and the canonical serialized chunk, so re-running
+gpu_clip.py on the same transcript only pays for chunks it has not seen.
+Entries expire after a TTL and the oldest used ones are evicted past a size cap.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    'RANKING_CACHE_PATH',
+    os.path.join(os.path.expanduser('~'), '.cache', 'clipception', 'rankings.sqlite')
+)
+DEFAULT_TTL_SECONDS = float(os.environ.get('RANKING_CACHE_TTL_DAYS', '30')) * 24 * 3600
+DEFAULT_MAX_BYTES = int(os.environ.get('RANKING_CACHE_MAX_MB', '256')) * 1024 * 1024
+
+def chunk_key(model, prompt_version, chunk):
+    """Cache key for one chunk of clips ranked by model with a given prompt template"""
+    canonical = json.dumps(chunk, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(f"{model}:{prompt_version}:{canonical}".encode('utf-8')).hexdigest()
+
+class RankingCache:
+    """SQLite table of key -> parsed clips, shared safely between ranking threads"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rankings ("
+            "key TEXT PRIMARY KEY, clips TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.commit()
+        self.prune()
+
+    def get(self, key):
+        """Cached clips for key, or None on a miss or an expired entry"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT clips FROM rankings WHERE key = ? AND created > ?", (key, now - self.ttl_seconds)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE rankings SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, clips):
+        """Store the parsed clips of one ranking call"""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO rankings (key, clips, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(clips, ensure_ascii=False), now, now)
+            )
+            self._db.commit()
+
+    def prune(self):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        with self._lock:
+            self._db.execute("DELETE FROM rankings WHERE created <= ?", (time.time() - self.ttl_seconds,))
+            total = self._db.execute("SELECT COALESCE(SUM(LENGTH(clips)), 0) FROM rankings").fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._db.execute("SELECT key, LENGTH(clips) FROM rankings ORDER BY last_used").fetchall()
+                evicted = []
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append((key,))
+                    total -= size
+                self._db.executemany("DELETE FROM rankings WHERE key = ?", evicted)
+            self._db.commit()
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        print(f"Ranking cache: {self.hits}/{lookups} chunks served from cache ({rate:.0f}% hit rate)")
+
+    def close(self):
+        self.prune()
+        self._db.close()
@@ -0,0 +1,98 @@
+"""
+Incremental ranking results
+TopKClips keeps only the best clips seen so far in a bounded heap, so ranking
+never holds or sorts the full result list. RankingJournal appends each chunk's
+parsed clips to an NDJSON file as soon as they arrive; a rerun after a crash
+replays the journaled chunks instead of paying for them again.
+"""
+
+import heapq
+import itertools
+import json
+import os
+from pathlib import Path
+
+class TopKClips:
+    """Bounded min-heap of the k highest scoring clips (unbounded when k is None)"""
+
+    def __init__(self, k=None):
+        self.k = k
+        self.total = 0
+        self._heap = []
+        self._counter = itertools.count()
+
+    @staticmethod
+    def _rank(clip):
+        # Higher score wins, then the earlier clip, matching the final sort order
+        return (clip.get('score', 0), -clip['start'])
+
+    def push(self, clip):
+        self.total += 1
+        entry = (self._rank(clip), -next(self._counter), clip)
+        if self.k is None or len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def extend(self, clips):
+        for clip in clips:
+            self.push(clip)
+
+    def drain(self):
+        """The kept clips, best first"""
+        return [clip for _, _, clip in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
+
+class RankingJournal:
+    """Append-only NDJSON of {key, chunk, stage, clips} records, one per ranked chunk"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A crash can leave the last line half written
+                        continue
+                    self.entries[record['key']] = record['clips']
+            if self.entries:
+                print(f"Replaying {len(self.entries)} journaled chunks from {self.path}")
+            self._truncate_torn_tail()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _truncate_torn_tail(self):
+        """Cut a half written last record so the next append starts on its own line"""
+        with open(self.path, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            end = size
+            # Walk back block by block to the last newline
+            while end > 0:
+                start = max(0, end - 4096)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b'\n')
+                if newline != -1:
+                    end = start + newline + 1
+                    break
+                end = start
+            if end < size:
+                print(f"Dropping a torn record at the end of {self.path}")
+                f.truncate(end)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def append(self, key, chunk_id, stage, clips):
+        """Record one chunk's results and push them to disk before moving on"""
+        self.entries[key] = clips
+        self._file.write(json.dumps({'key': key, 'chunk': chunk_id, 'stage': stage, 'clips': clips},
+                                    ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def clear(self):
+        """Remove the journal once the final output is written"""
+        self._file.close()
+        if self.path.exists():
+            self.path.unlink()
@@ -0,0 +1,30 @@
+"""
+Helpers for the clip timestamps passed between pipeline stages.
+The LLM returns start/end as numbers, numeric strings or "HH:MM:SS(.ff)" timecodes.
+"""
+
+def parse_timestamp(value):
+    """Convert a number, numeric string or [HH:]MM:SS(.ff) timecode to seconds
+
+    Returns None when the value can't be interpreted.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    text = str(value).strip().rstrip('s')
+    if not text:
+        return None
+
+    try:
+        parts = [float(part) for part in text.split(':')]
+    except ValueError:
+        return None
+    if len(parts) > 3 or any(part < 0 for part in parts):
+        return None
+
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return seconds
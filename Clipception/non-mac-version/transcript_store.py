@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Compact transcript storage
+A transcript is stored as NDJSON (one combined segment per line, readable as a
+stream) next to a columnar .npy file holding the numeric start/end/feature
+columns in the same row order, which loads memory-mapped. The indented JSON
+list that gpu_clip.py has always read stays available as an export.
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+# Numeric columns of a combined segment, in file order
+COLUMN_DTYPE = np.dtype([
+    ('start', np.float64),
+    ('end', np.float64),
+    ('volume', np.float32),
+    ('zero_crossing_rate', np.float32),
+    ('spectral_centroid', np.float32),
+])
+
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+def columns_path(ndjson_path):
+    """Path of the column file that belongs to an NDJSON transcript"""
+    return Path(ndjson_path).with_suffix('.npy')
+
+def segment_row(segment):
+    """Numeric column values of one combined segment"""
+    features = segment["audio_features"]
+    return (
+        segment["start"],
+        segment["end"],
+        features["volume"]["value"],
+        features["characteristics"]["zero_crossing_rate"],
+        features["characteristics"]["spectral_centroid"],
+    )
+
+def write_ndjson(segments, ndjson_path):
+    """Write segments as NDJSON plus their column file, one line as each segment arrives
+
+    Both files are built under .part names and only replace existing ones
+    once every segment is written. Returns the number of segments.
+    """
+    ndjson_path = Path(ndjson_path)
+    partial_path = ndjson_path.with_name(ndjson_path.name + '.part')
+    rows = []
+
+    with open(partial_path, 'w', encoding='utf-8') as f:
+        for segment in segments:
+            f.write(json.dumps(segment, ensure_ascii=False, separators=(',', ':')) + '\n')
+            f.flush()
+            rows.append(segment_row(segment))
+
+    write_columns(rows, columns_path(ndjson_path))
+    os.replace(partial_path, ndjson_path)
+    return len(rows)
+
+def write_columns(rows, path):
+    """Save column rows as a structured .npy array"""
+    path = Path(path)
+    partial_path = path.with_name(path.name + '.part')
+    with open(partial_path, 'wb') as f:
+        np.save(f, np.array(rows, dtype=COLUMN_DTYPE))
+    os.replace(partial_path, path)
+
+def rebuild_columns(ndjson_path):
+    """Regenerate the column file of an NDJSON transcript from its lines"""
+    path = columns_path(ndjson_path)
+    write_columns([segment_row(segment) for segment in iter_ndjson(ndjson_path)], path)
+    return path
+
+def iter_ndjson(ndjson_path):
+    """Lazily yield segments from an NDJSON transcript"""
+    with open(ndjson_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def iter_segments(path):
+    """Yield segments from an NDJSON transcript lazily, or from a JSON list transcript"""
+    if str(path).endswith(NDJSON_SUFFIXES):
+        yield from iter_ndjson(path)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+
+def load_columns(ndjson_path):
+    """Memory-map the start/end/feature columns of an NDJSON transcript
+
+    Rebuilds the column file from the NDJSON if it is missing.
+    """
+    path = columns_path(ndjson_path)
+    if not path.exists():
+        rebuild_columns(ndjson_path)
+    return np.load(path, mmap_mode='r')
+
+def export_json(ndjson_path, json_path):
+    """Export an NDJSON transcript as the indented JSON list gpu_clip.py has always read"""
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(list(iter_ndjson(ndjson_path)), f, indent=2, ensure_ascii=False)
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert compact NDJSON transcripts')
+    parser.add_argument('ndjson_path', help='NDJSON transcript to read')
+    parser.add_argument('--json', metavar='OUTPUT', help='Export as an indented JSON list')
+    parser.add_argument('--columns', action='store_true', help='Rebuild the .npy column file')
+
+    args = parser.parse_args()
+
+    if args.columns:
+        print(f"Columns saved to {rebuild_columns(args.ndjson_path)}")
+    if args.json:
+        export_json(args.ndjson_path, args.json)
+        print(f"Transcript exported to {args.json}")
+
+if __name__ == "__main__":
+    main()
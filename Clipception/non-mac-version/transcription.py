@@ -1,40 +1,30 @@
-# Try different ways to import Whisper for compatibility
-try:
-    # Try standard import first
-    import openai.whisper as whisper
-except ImportError:
-    try:
-        # Try direct OpenAI import
-        from openai import whisper
-    except ImportError:
-        try:
-            # Try regular import (if OpenAI whisper is properly installed)
-            import whisper
-            # Verify it has the load_model attribute
-            if not hasattr(whisper, 'load_model'):
-                raise ImportError("Whisper module doesn't have load_model attribute")
-        except ImportError:
-            print("ERROR: Cannot import proper whisper module.")
-            print("Please install OpenAI's Whisper with:")
-            print("pip install git+https://github.com/openai/whisper.git")
-            import sys
-            sys.exit(1)
-
-# Rest of the original imports
 from pathlib import Path
 import json
 import argparse
 import subprocess
-import torch
 import time
 import numpy as np
 from datetime import timedelta
-from pydub import AudioSegment
-import librosa
 import soundfile as sf
 import os
+import shutil
+import textwrap
 import atexit
 import sys
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from transcription_client import try_server_transcription
+# Whisper works on 16 kHz mono audio; every decode path targets SAMPLE_RATE
+from transcription_backends import BACKENDS, SAMPLE_RATE, load_backend
+from timecodes import parse_timestamp
+from transcription_cache import TranscriptionCache
+from transcription_checkpoint import TranscriptionCheckpoint
+import transcript_store
+from clip_candidates import DEFAULT_WINDOW_LENGTHS, select_candidates
+
+# Features have always been measured on int16 sample values, so float
+# buffers are rescaled to keep the values comparable.
+PCM16_SCALE = 32768.0
 
 def format_time(seconds):
     """Convert seconds into human readable time string"""
@@ -44,6 +34,12 @@ def format_time(seconds):
 
 def check_gpu():
     """Check if CUDA GPU is available and print device info"""
+    try:
+        import torch
+    except ImportError:
+        print("PyTorch not installed, using CPU")
+        return "cpu"
+    
     if torch.cuda.is_available():
         device = torch.cuda.get_device_properties(0)
         print(f"Using GPU: {device.name} with {device.total_memory / 1024**3:.2f} GB memory")
@@ -52,28 +48,8 @@ def check_gpu():
         print("No GPU found, using CPU")
         return "cpu"
 
-def extract_audio_features(audio_segment, start_time, end_time):
-    """Extract audio features for a segment including volume and emotional characteristics"""
-    # Convert milliseconds to samples
-    start_sample = int(start_time * 1000)
-    end_sample = int(end_time * 1000)
-    
-    # Extract the specific segment
-    segment = audio_segment[start_sample:end_sample]
-    
-    # Convert to numpy array for analysis
-    samples = np.array(segment.get_array_of_samples())
-    
-    # Calculate basic audio features
-    rms = librosa.feature.rms(y=samples.astype(float))[0]
-    zero_crossing_rate = librosa.feature.zero_crossing_rate(samples.astype(float))[0]
-    spectral_centroid = librosa.feature.spectral_centroid(y=samples.astype(float), sr=segment.frame_rate)[0]
-    
-    # Calculate average values
-    avg_volume = float(np.mean(rms))
-    avg_zcr = float(np.mean(zero_crossing_rate))
-    avg_spectral_centroid = float(np.mean(spectral_centroid))
-    
+def describe_audio_features(avg_volume, avg_zcr, avg_spectral_centroid):
+    """Build the audio_features dict from averaged volume, ZCR and centroid"""
     # Determine volume level
     if avg_volume < 0.1:
         volume_level = "quiet"
@@ -88,15 +64,195 @@ def extract_audio_features(audio_segment, start_time, end_time):
     return {
         "volume": {
             "level": volume_level,
-            "value": avg_volume
+            "value": float(avg_volume)
         },
         "characteristics": {
             "intensity": intensity,
-            "zero_crossing_rate": avg_zcr,
-            "spectral_centroid": avg_spectral_centroid
+            "zero_crossing_rate": float(avg_zcr),
+            "spectral_centroid": float(avg_spectral_centroid)
         }
     }
 
+class AudioFeatureTrack:
+    """Frame-level RMS, zero crossing rate and spectral centroid for a whole recording
+
+    All three features share one framing of the signal (and one STFT for the
+    centroid), computed block by block so memory stays bounded on long VODs.
+    Per-frame values are kept as prefix sums, so the average over any time
+    window is two lookups regardless of its length.
+    """
+
+    def __init__(self, samples, sr=SAMPLE_RATE, frame_length=2048, hop_length=512,
+                 scale=1.0, block_frames=1024):
+        self.sr = sr
+        self.hop_length = hop_length
+        self.n_frames = 1 + len(samples) // hop_length
+        
+        half = frame_length // 2
+        window = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame_length) / frame_length)
+        freqs = np.fft.rfftfreq(frame_length, d=1.0 / sr)
+        tracks = np.zeros((3, self.n_frames), dtype=np.float64)
+        
+        for first in range(0, self.n_frames, block_frames):
+            last = min(self.n_frames, first + block_frames)
+            
+            # Frames are centred on first*hop (zero padded at the edges) like librosa's center=True
+            lo = first * hop_length - half
+            hi = (last - 1) * hop_length + half
+            chunk = np.zeros(hi - lo, dtype=np.float32)
+            src_lo, src_hi = max(lo, 0), min(hi, len(samples))
+            if src_hi > src_lo:
+                chunk[src_lo - lo:src_hi - lo] = samples[src_lo:src_hi]
+            chunk *= scale
+            
+            frames = np.lib.stride_tricks.sliding_window_view(chunk, frame_length)[::hop_length]
+            
+            tracks[0, first:last] = np.sqrt(np.mean(np.square(frames), axis=1))
+            signs = np.signbit(frames)
+            tracks[1, first:last] = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_length
+            
+            magnitude = np.abs(np.fft.rfft(frames * window, axis=1))
+            total = magnitude.sum(axis=1)
+            weighted = magnitude @ freqs
+            tracks[2, first:last] = np.divide(weighted, total, out=np.zeros_like(weighted), where=total > 0)
+        
+        self._prefix = np.zeros((3, self.n_frames + 1), dtype=np.float64)
+        np.cumsum(tracks, axis=1, out=self._prefix[:, 1:])
+    
+    def window(self, start_time, end_time):
+        """Return (avg_volume, avg_zcr, avg_spectral_centroid) over [start_time, end_time)"""
+        first = min(max(int(np.ceil(start_time * self.sr / self.hop_length)), 0), self.n_frames - 1)
+        last = min(max(int(np.ceil(end_time * self.sr / self.hop_length)), first + 1), self.n_frames)
+        return tuple((self._prefix[:, last] - self._prefix[:, first]) / (last - first))
+    
+    def frame_rms(self):
+        """Per-frame RMS values recovered from the prefix sums"""
+        return np.diff(self._prefix[0])
+    
+    def frame_zcr(self):
+        """Per-frame zero crossing rates recovered from the prefix sums"""
+        return np.diff(self._prefix[1])
+
+def load_feature_track(audio_path):
+    """Build an AudioFeatureTrack from a decode_audio buffer or an extracted WAV"""
+    print("Computing frame-level audio features...")
+    track_start = time.time()
+    
+    if isinstance(audio_path, np.ndarray):
+        feature_track = AudioFeatureTrack(audio_path, SAMPLE_RATE, scale=PCM16_SCALE)
+    else:
+        # int16 samples keep the scale the pydub-based features always had
+        samples, sr = sf.read(str(audio_path), dtype='int16')
+        feature_track = AudioFeatureTrack(samples, sr)
+    
+    print(f"Audio feature track ({feature_track.n_frames} frames) took: {format_time(time.time() - track_start)}")
+    return feature_track
+
+def extract_audio_features(feature_track, start_time, end_time):
+    """Extract audio features for a segment including volume and emotional characteristics"""
+    return describe_audio_features(*feature_track.window(start_time, end_time))
+
+def _rolling_mean_std(values, width):
+    """Mean and standard deviation of values over a centred window of width frames"""
+    padded = np.pad(values, (width // 2, width - 1 - width // 2), mode='edge')
+    sums = np.concatenate(([0.0], np.cumsum(padded)))
+    squares = np.concatenate(([0.0], np.cumsum(np.square(padded))))
+    mean = (sums[width:] - sums[:-width]) / width
+    variance = (squares[width:] - squares[:-width]) / width - np.square(mean)
+    return mean, np.sqrt(np.maximum(variance, 0.0))
+
+def detect_speech_regions(feature_track, duration, margin_db=10.0, min_db=-55.0,
+                          min_silence=1.0, min_speech=0.25, padding=0.2,
+                          music_window=1.0, steady_db=4.0, steady_zcr=0.5):
+    """Find (start, end) times in seconds that contain speech
+
+    Frames louder than the noise floor (10th percentile level) plus margin_db,
+    and never quieter than min_db dBFS, count as active unless they sound like
+    music. Speech rises and falls with every syllable and swings between voiced
+    (low ZCR) and unvoiced (high ZCR) sounds, so a frame whose level varies by
+    less than steady_db and whose ZCR varies by less than steady_zcr of its
+    mean over music_window seconds is treated as music and skipped. Gaps
+    shorter than min_silence are bridged, blips shorter than min_speech
+    dropped, and each region padded so word onsets aren't clipped.
+    """
+    frame_seconds = feature_track.hop_length / feature_track.sr
+    level_db = 20 * np.log10(np.maximum(feature_track.frame_rms(), 1e-9) / PCM16_SCALE)
+    threshold = max(np.percentile(level_db, 10) + margin_db, min_db)
+    
+    width = max(int(round(music_window / frame_seconds)), 3)
+    _, level_spread = _rolling_mean_std(level_db, width)
+    zcr_mean, zcr_spread = _rolling_mean_std(feature_track.frame_zcr(), width)
+    steady = (level_spread < steady_db) & (zcr_spread < steady_zcr * np.maximum(zcr_mean, 1e-9))
+    active = (level_db > threshold) & ~steady
+    
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], active.astype(np.int8), [0]))))
+    starts = edges[::2] * frame_seconds
+    ends = edges[1::2] * frame_seconds
+    if len(starts) == 0:
+        return []
+    
+    keep_gap = (starts[1:] - ends[:-1]) >= min_silence
+    starts = starts[np.concatenate(([True], keep_gap))]
+    ends = ends[np.concatenate((keep_gap, [True]))]
+    
+    long_enough = (ends - starts) >= min_speech
+    starts = np.maximum(starts[long_enough] - padding, 0.0)
+    ends = np.minimum(ends[long_enough] + padding, duration)
+    
+    return list(zip(starts.tolist(), ends.tolist()))
+
+class SpeechTimeline:
+    """Maps times in a buffer of concatenated speech regions back to source times"""
+    
+    # Silence inserted between regions so Whisper hears a pause at each join
+    GAP_SECONDS = 0.3
+    
+    def __init__(self, regions):
+        self.regions = regions
+        durations = np.array([end - start for start, end in regions])
+        self.source_starts = np.array([start for start, _ in regions])
+        self.source_ends = np.array([end for _, end in regions])
+        self.condensed_starts = np.concatenate(([0.0], np.cumsum(durations + self.GAP_SECONDS)[:-1]))
+        self.speech_seconds = float(durations.sum())
+    
+    def condense(self, samples):
+        """Concatenate the speech regions of samples with a short gap between each"""
+        gap = np.zeros(int(self.GAP_SECONDS * SAMPLE_RATE), dtype=np.float32)
+        pieces = []
+        for start, end in self.regions:
+            pieces.append(np.asarray(samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)], dtype=np.float32))
+            pieces.append(gap)
+        return np.concatenate(pieces)
+    
+    def to_source(self, condensed_time):
+        """Convert a time in the condensed buffer into the source timeline"""
+        index = max(int(np.searchsorted(self.condensed_starts, condensed_time, side='right')) - 1, 0)
+        source_time = condensed_time - self.condensed_starts[index] + self.source_starts[index]
+        # Times inside an inserted gap belong to the end of the preceding region
+        return float(min(source_time, self.source_ends[index]))
+
+def transcribe_samples(model, samples, feature_track, vad=False, **options):
+    """Transcribe a sample buffer, optionally sending only its speech regions to the model
+
+    Returns the Whisper-style result, with segment times in the buffer's own
+    timeline, and the number of seconds the VAD pre-pass skipped.
+    """
+    if not vad:
+        return model.transcribe(samples, **options), 0.0
+    
+    duration = len(samples) / SAMPLE_RATE
+    regions = detect_speech_regions(feature_track, duration)
+    if not regions:
+        return {"text": "", "segments": []}, duration
+    
+    timeline = SpeechTimeline(regions)
+    result = model.transcribe(timeline.condense(samples), **options)
+    for segment in result["segments"]:
+        segment["start"] = timeline.to_source(segment["start"])
+        segment["end"] = timeline.to_source(segment["end"])
+    
+    return result, duration - timeline.speech_seconds
+
 def extract_audio(video_path):
     """Extract audio from video using ffmpeg"""
     video_file = Path(video_path)
@@ -117,8 +273,53 @@ def extract_audio(video_path):
     
     return audio_path
 
-def combine_segments(segments):
-    """Combine multiple segments into a single segment with merged features"""
+def decode_audio(video_path, reuse_bytes=None):
+    """Decode audio once into a memory-mapped float32 buffer at SAMPLE_RATE
+
+    ffmpeg's raw PCM output is piped straight into the buffer's backing file,
+    so no WAV is written and nothing re-decodes the media afterwards. The
+    same array feeds both Whisper and feature extraction. A buffer left by
+    an interrupted run is reused when its size matches reuse_bytes.
+    """
+    video_file = Path(video_path)
+    buffer_path = video_file.with_suffix('.f32')
+    
+    # Register buffer file for cleanup before ffmpeg starts writing it
+    global files_to_cleanup
+    if str(buffer_path) not in files_to_cleanup:
+        files_to_cleanup.append(str(buffer_path))
+    
+    if reuse_bytes and buffer_path.exists() and buffer_path.stat().st_size == reuse_bytes:
+        print(f"Reusing decoded audio from {buffer_path}")
+        return np.memmap(buffer_path, dtype=np.float32, mode='c')
+    
+    print(f"Decoding audio to {buffer_path}...")
+    
+    with subprocess.Popen([
+        'ffmpeg', '-nostdin', '-loglevel', 'error',
+        '-i', str(video_file),
+        '-vn', '-acodec', 'pcm_f32le', '-f', 'f32le',
+        '-ar', str(SAMPLE_RATE), '-ac', '1',
+        'pipe:1'
+    ], stdout=subprocess.PIPE) as process, open(buffer_path, 'wb') as buffer_file:
+        shutil.copyfileobj(process.stdout, buffer_file, 1 << 20)
+    
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode audio (exit code {process.returncode})")
+    if buffer_path.stat().st_size == 0:
+        raise RuntimeError(f"No audio stream found in {video_file.name}")
+    
+    # Copy-on-write keeps the array writable for torch without touching the file
+    audio = np.memmap(buffer_path, dtype=np.float32, mode='c')
+    print(f"Decoded {format_time(len(audio) / SAMPLE_RATE)} of audio")
+    return audio
+
+def combine_segments(segments, feature_track=None):
+    """Combine multiple segments into a single segment with merged features
+
+    With a feature_track the merged features are measured over the whole
+    combined span; otherwise the per-segment averages are averaged.
+    """
     if not segments:
         return None
         
@@ -127,130 +328,576 @@ def combine_segments(segments):
     start_time = segments[0]["start"]
     end_time = segments[-1]["end"]
     
-    volumes = [seg["audio_features"]["volume"]["value"] for seg in segments]
-    zcrs = [seg["audio_features"]["characteristics"]["zero_crossing_rate"] for seg in segments]
-    centroids = [seg["audio_features"]["characteristics"]["spectral_centroid"] for seg in segments]
-    
-    avg_volume = np.mean(volumes)
-    avg_zcr = np.mean(zcrs)
-    avg_centroid = np.mean(centroids)
-    
-    volume_level = "loud" if avg_volume >= 0.3 else "normal" if avg_volume >= 0.1 else "quiet"
-    intensity = "high" if avg_zcr > 0.15 and avg_centroid > 2000 else "normal"
+    if feature_track is not None:
+        audio_features = extract_audio_features(feature_track, start_time, end_time)
+    else:
+        volumes = [seg["audio_features"]["volume"]["value"] for seg in segments]
+        zcrs = [seg["audio_features"]["characteristics"]["zero_crossing_rate"] for seg in segments]
+        centroids = [seg["audio_features"]["characteristics"]["spectral_centroid"] for seg in segments]
+        audio_features = describe_audio_features(np.mean(volumes), np.mean(zcrs), np.mean(centroids))
     
     return {
         "start": start_time,
         "end": end_time,
         "text": combined_text,
-        "audio_features": {
-            "volume": {
-                "level": volume_level,
-                "value": float(avg_volume)
-            },
-            "characteristics": {
-                "intensity": intensity,
-                "zero_crossing_rate": float(avg_zcr),
-                "spectral_centroid": float(avg_centroid)
-            }
-        }
+        "audio_features": audio_features
+    }
+
+def enhance_segment(segment, feature_track, offset=0.0):
+    """Attach audio features to a Whisper segment, shifting its times by offset seconds"""
+    return {
+        "start": segment["start"] + offset,
+        "end": segment["end"] + offset,
+        "text": segment["text"],
+        "audio_features": extract_audio_features(
+            feature_track,
+            segment["start"],
+            segment["end"]
+        )
     }
 
-def transcribe_with_features(model, audio_path, device, min_duration=15.0):
-    """Get transcription with timestamps and audio features"""
+def iter_combined_segments(segments, min_duration=15.0, feature_track=None):
+    """Greedily glue enhanced segments into blocks of at least min_duration seconds"""
+    current_segments = []
+    
+    for segment in segments:
+        current_segments.append(segment)
+        current_duration = current_segments[-1]["end"] - current_segments[0]["start"]
+        
+        if current_duration >= min_duration:
+            yield combine_segments(current_segments, feature_track)
+            current_segments = []
+    
+    if current_segments:
+        yield combine_segments(current_segments, feature_track)
+
+def iter_candidate_segments(segments, top_n, window_lengths=DEFAULT_WINDOW_LENGTHS, feature_track=None):
+    """Combine the top_n non-overlapping sliding-window candidates, in time order"""
+    segments = list(segments)
+    for first, last, score in select_candidates(segments, top_n, window_lengths):
+        combined = combine_segments(segments[first:last + 1], feature_track)
+        combined["candidate_score"] = round(score, 3)
+        yield combined
+
+def combine_for_ranking(segments, min_duration=15.0, feature_track=None, candidates=0,
+                        candidate_lengths=DEFAULT_WINDOW_LENGTHS):
+    """Combined segments for gpu_clip.py: greedy blocks, or the best sliding-window candidates"""
+    if candidates:
+        return iter_candidate_segments(segments, candidates, candidate_lengths, feature_track)
+    return iter_combined_segments(segments, min_duration, feature_track)
+
+def transcribe_with_features(model, audio_path, device, min_duration=15.0, vad=False, batch_size=1,
+                             candidates=0, candidate_lengths=DEFAULT_WINDOW_LENGTHS):
+    """Get transcription with timestamps and audio features
+
+    audio_path may also be a float32 buffer from decode_audio, in which case
+    it is passed to Whisper directly and reused for feature extraction.
+    vad (buffers only) sends just the detected speech regions to the model,
+    and batch_size > 1 decodes that many 30 second windows per forward pass.
+    With candidates, the best that many sliding windows of candidate_lengths
+    seconds are returned instead of min_duration blocks.
+    """
     print("Generating enhanced transcription...")
-    enhanced_segments = []
     
-    audio = AudioSegment.from_wav(str(audio_path))
+    whisper_input = audio_path if isinstance(audio_path, np.ndarray) else str(audio_path)
+    feature_track = load_feature_track(audio_path)
     
     transcribe_start = time.time()
     
-    result = model.transcribe(str(audio_path), language='en', fp16=(device == "cuda"))
+    result, skipped_seconds = transcribe_samples(
+        model, whisper_input, feature_track, vad,
+        language='en', fp16=(device == "cuda"), batch_size=batch_size
+    )
+    if vad:
+        print(f"VAD skipped {skipped_seconds:.1f}s of {len(audio_path) / SAMPLE_RATE:.1f}s of audio")
     
-    current_segments = []
-    current_duration = 0.0
+    segments = (enhance_segment(segment, feature_track) for segment in result["segments"])
+    enhanced_segments = list(combine_for_ranking(
+        segments, min_duration, feature_track, candidates, candidate_lengths
+    ))
     
-    for segment in result["segments"]:
-        audio_features = extract_audio_features(
-            audio,
-            segment["start"],
-            segment["end"]
+    transcribe_end = time.time()
+    print(f"Enhanced transcription processing took: {format_time(transcribe_end - transcribe_start)}")
+    
+    return enhanced_segments
+
+def stream_transcribe_with_features(model, audio, device, window_seconds=600.0, overlap_seconds=30.0,
+                                    vad=False, batch_size=1, checkpoint=None):
+    """Yield enhanced segments window by window over a decode_audio buffer
+
+    Only one window of samples and its feature track are resident at a time.
+    Consecutive windows overlap; a segment that starts in the second half of
+    the overlap, or runs into the end of its window, is left for the next
+    window, which restarts early enough to see it whole. Segments mostly
+    covering audio that was already emitted are dropped as seam duplicates.
+    With a TranscriptionCheckpoint every finished window is committed, and
+    a saved run is replayed and continued from its next offset.
+    """
+    print("Generating enhanced transcription (streaming)...")
+    
+    total_samples = len(audio)
+    window_samples = int(window_seconds * SAMPLE_RATE)
+    overlap_samples = min(int(overlap_seconds * SAMPLE_RATE), window_samples // 2)
+    min_advance = max((window_samples - overlap_samples) // 2, SAMPLE_RATE)
+    
+    offset = 0
+    emitted_until = 0.0
+    previous_text = None
+    skipped_seconds = 0.0
+    
+    state = checkpoint.load() if checkpoint is not None else None
+    if state is not None:
+        offset = state['offset']
+        emitted_until = state['emitted_until']
+        previous_text = state['previous_text']
+        skipped_seconds = state['skipped_seconds']
+        saved_segments = checkpoint.load_segments()
+        print(f"Resuming from checkpoint at {format_time(offset / SAMPLE_RATE)} "
+              f"with {len(saved_segments)} segments already transcribed")
+        yield from saved_segments
+    
+    while offset < total_samples:
+        window_start = time.time()
+        end = min(offset + window_samples, total_samples)
+        is_last = end >= total_samples
+        
+        chunk = np.array(audio[offset:end], dtype=np.float32)
+        feature_track = AudioFeatureTrack(chunk, SAMPLE_RATE, scale=PCM16_SCALE)
+        result, window_skipped = transcribe_samples(
+            model, chunk, feature_track, vad,
+            language='en', fp16=(device == "cuda"), initial_prompt=previous_text, batch_size=batch_size
         )
         
-        enhanced_segment = {
-            "start": segment["start"],
-            "end": segment["end"],
-            "text": segment["text"],
-            "audio_features": audio_features
-        }
+        chunk_offset = offset / SAMPLE_RATE
+        seam = (end - overlap_samples / 2) / SAMPLE_RATE
+        window_end = end / SAMPLE_RATE
+        next_offset = end - overlap_samples
+        window_segments = []
         
-        current_segments.append(enhanced_segment)
-        current_duration = current_segments[-1]["end"] - current_segments[0]["start"]
+        for segment in result["segments"]:
+            start_time = segment["start"] + chunk_offset
+            end_time = min(segment["end"] + chunk_offset, window_end)
+            
+            if not is_last and (start_time >= seam or end_time >= window_end - 0.5):
+                next_offset = min(next_offset, int(start_time * SAMPLE_RATE))
+                break
+            if (start_time + end_time) / 2 < emitted_until:
+                continue
+            
+            enhanced = enhance_segment(segment, feature_track, chunk_offset)
+            enhanced["end"] = end_time
+            emitted_until = end_time
+            previous_text = segment["text"]
+            window_segments.append(enhanced)
+            yield enhanced
         
-        if current_duration >= min_duration:
-            combined_segment = combine_segments(current_segments)
-            if combined_segment:
-                enhanced_segments.append(combined_segment)
-            current_segments = []
-            current_duration = 0.0
+        print(f"Window {format_time(chunk_offset)} - {format_time(window_end)}: "
+              f"{len(window_segments)} segments in {format_time(time.time() - window_start)}")
+        
+        if is_last:
+            skipped_seconds += window_skipped
+            next_offset = total_samples
+        else:
+            # Only count the part of the window that won't be seen again
+            next_offset = max(next_offset, offset + min_advance)
+            skipped_seconds += window_skipped * (next_offset - offset) / (end - offset)
+        
+        if checkpoint is not None:
+            checkpoint.save(
+                window_segments,
+                offset=next_offset,
+                emitted_until=emitted_until,
+                previous_text=previous_text,
+                skipped_seconds=skipped_seconds
+            )
+        offset = next_offset
     
-    if current_segments:
-        combined_segment = combine_segments(current_segments)
-        if combined_segment:
-            enhanced_segments.append(combined_segment)
+    if vad:
+        print(f"VAD skipped about {skipped_seconds:.1f}s of {total_samples / SAMPLE_RATE:.1f}s of audio")
+
+def find_silence_boundaries(audio, n_shards, search_seconds=60.0, frame_seconds=0.5):
+    """Split a buffer into n_shards (start, end) sample ranges cut at the quietest nearby frame
+
+    Each cut is placed at the lowest-energy frame within search_seconds of the
+    evenly spaced target, so shards rarely split a spoken sentence.
+    """
+    total_samples = len(audio)
+    frame = int(frame_seconds * SAMPLE_RATE)
+    search = int(search_seconds * SAMPLE_RATE)
+    bounds = [0]
+    
+    for i in range(1, n_shards):
+        target = total_samples * i // n_shards
+        lo = max(bounds[-1] + frame, target - search)
+        hi = min(total_samples - frame, target + search)
+        if hi - lo < frame:
+            continue
+        
+        region = np.asarray(audio[lo:hi], dtype=np.float32)
+        n_frames = len(region) // frame
+        energy = np.square(region[:n_frames * frame]).reshape(n_frames, frame).mean(axis=1)
+        bounds.append(lo + int(np.argmin(energy)) * frame + frame // 2)
+    
+    bounds.append(total_samples)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+# Transcription backend owned by each worker process
+_worker_model = None
+
+def _init_transcribe_worker(backend, model_size, num_threads):
+    """Load one model per worker process and cap its CPU threads"""
+    global _worker_model
+    _worker_model = load_backend(backend, model_size, "cpu", num_threads)
+
+def _transcribe_shard(buffer_path, start_sample, end_sample, vad=False, batch_size=1):
+    """Transcribe one shard of a decode_audio buffer
+
+    Returns the shard's segments in absolute time and the seconds VAD skipped.
+    """
+    audio = np.memmap(buffer_path, dtype=np.float32, mode='r')
+    chunk = np.array(audio[start_sample:end_sample])
+    offset = start_sample / SAMPLE_RATE
+    feature_track = AudioFeatureTrack(chunk, SAMPLE_RATE, scale=PCM16_SCALE) if vad else None
+    
+    result, skipped_seconds = transcribe_samples(
+        _worker_model, chunk, feature_track, vad, language='en', fp16=False, batch_size=batch_size
+    )
+    
+    return [
+        {
+            "start": segment["start"] + offset,
+            "end": min(segment["end"], len(chunk) / SAMPLE_RATE) + offset,
+            "text": segment["text"]
+        }
+        for segment in result["segments"]
+    ], skipped_seconds
+
+def transcribe_parallel_with_features(audio, model_size, workers, min_duration=15.0, backend='whisper',
+                                      vad=False, batch_size=1, candidates=0,
+                                      candidate_lengths=DEFAULT_WINDOW_LENGTHS):
+    """Transcribe a decode_audio buffer with one CPU model per worker process
+
+    The buffer is cut into silence-aligned shards that workers read straight
+    from the memory-mapped file; their segments are stitched back in order
+    and combined exactly like transcribe_with_features.
+    """
+    print(f"Generating enhanced transcription with {workers} worker processes...")
+    
+    feature_track = load_feature_track(audio)
+    
+    transcribe_start = time.time()
+    
+    shards = find_silence_boundaries(audio, workers)
+    for start_sample, end_sample in shards:
+        print(f"Shard {format_time(start_sample / SAMPLE_RATE)} - {format_time(end_sample / SAMPLE_RATE)}")
+    
+    # Split the cores between workers so they don't oversubscribe them
+    num_threads = max(1, (os.cpu_count() or 1) // len(shards))
+    starts, ends = zip(*shards)
+    
+    with ProcessPoolExecutor(
+        max_workers=len(shards),
+        mp_context=mp.get_context('spawn'),
+        initializer=_init_transcribe_worker,
+        initargs=(backend, model_size, num_threads)
+    ) as executor:
+        shard_results = list(executor.map(
+            _transcribe_shard, [audio.filename] * len(shards), starts, ends,
+            [vad] * len(shards), [batch_size] * len(shards)
+        ))
+    
+    if vad:
+        skipped_seconds = sum(skipped for _, skipped in shard_results)
+        print(f"VAD skipped {skipped_seconds:.1f}s of {len(audio) / SAMPLE_RATE:.1f}s of audio")
+    
+    segments = (
+        enhance_segment(segment, feature_track)
+        for shard_segments, _ in shard_results
+        for segment in shard_segments
+    )
+    enhanced_segments = list(combine_for_ranking(
+        segments, min_duration, feature_track, candidates, candidate_lengths
+    ))
     
     transcribe_end = time.time()
     print(f"Enhanced transcription processing took: {format_time(transcribe_end - transcribe_start)}")
+    print(f"Backend {backend} ({model_size}, {len(shards)} CPU workers): real-time factor "
+          f"{(transcribe_end - transcribe_start) / (len(audio) / SAMPLE_RATE):.3f}")
     
     return enhanced_segments
 
-def cleanup_files():
-    """Clean up temporary files created during processing"""
+def transcript_path_for(video_path, transcript_format='json'):
+    """Output path of a video's enhanced transcription in the given format"""
+    return Path(video_path).with_suffix(f'.enhanced_transcription.{transcript_format}')
+
+def write_transcript(segments, transcription_path, transcript_format='json'):
+    """Write combined segments as they arrive, as a JSON list or as NDJSON plus columns
+
+    Returns the number of segments written.
+    """
+    if transcript_format == 'ndjson':
+        return transcript_store.write_ndjson(segments, transcription_path)
+    return write_segments_incrementally(segments, transcription_path)
+
+def write_segments_incrementally(segments, transcription_path):
+    """Write segments to a JSON array as each one arrives
+
+    The output is byte-for-byte what json.dump(..., indent=2) produces, but it
+    is built in a .part file that only replaces transcription_path once
+    every segment has been written.
+    """
+    transcription_path = Path(transcription_path)
+    partial_path = transcription_path.with_name(transcription_path.name + '.part')
+    count = 0
+    
+    with open(partial_path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for segment in segments:
+            f.write(',\n' if count else '\n')
+            f.write(textwrap.indent(json.dumps(segment, indent=2, ensure_ascii=False), '  '))
+            f.flush()
+            count += 1
+        f.write('\n]' if count else ']')
+    
+    os.replace(partial_path, transcription_path)
+    return count
+
+def decode_audio_window(video_path, start_time, duration):
+    """Decode only [start_time, start_time + duration) of a video's audio into a float32 array"""
+    process = subprocess.run([
+        'ffmpeg', '-nostdin', '-loglevel', 'error',
+        '-ss', f"{start_time:.3f}", '-t', f"{duration:.3f}",
+        '-i', str(video_path),
+        '-vn', '-acodec', 'pcm_f32le', '-f', 'f32le',
+        '-ar', str(SAMPLE_RATE), '-ac', '1',
+        'pipe:1'
+    ], stdout=subprocess.PIPE)
+    
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode audio window at {format_time(start_time)}")
+    return np.frombuffer(process.stdout, dtype=np.float32).copy()
+
+def refine_clips(video_path, clips_json, model_size="medium", backend='whisper', padding=2.0):
+    """Second pass of two-pass mode: re-transcribe only the ranked clip windows with a larger model
+
+    Each clip in clips_json gets its padded window decoded straight from the
+    video and transcribed again. The refined segments and text are stored on
+    the clip ("segments", "transcript"), replacing the draft transcription as
+    the source for titles and captions.
+    """
+    refine_start = time.time()
+    device = check_gpu()
+    
+    with open(clips_json, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    clips = data.get('top_clips', [])
+    
+    print(f"Refining {len(clips)} clips with {model_size}...")
+    model = load_backend(backend, model_size, device)
+    
+    refined = 0
+    for clip in clips:
+        start_time = parse_timestamp(clip.get('start'))
+        end_time = parse_timestamp(clip.get('end'))
+        if start_time is None or end_time is None or end_time <= start_time:
+            print(f"Skipping clip with unusable times: {clip.get('name')}")
+            continue
+        
+        window_start = max(start_time - padding, 0.0)
+        samples = decode_audio_window(video_path, window_start, end_time + padding - window_start)
+        if len(samples) == 0:
+            continue
+        
+        result = model.transcribe(samples, language='en', fp16=(device == "cuda"))
+        
+        segments = [
+            {
+                "start": segment["start"] + window_start,
+                "end": segment["end"] + window_start,
+                "text": segment["text"]
+            }
+            for segment in result["segments"]
+            # Padding is only context; keep segments that overlap the clip itself
+            if segment["end"] + window_start > start_time and segment["start"] + window_start < end_time
+        ]
+        clip["segments"] = segments
+        clip["transcript"] = " ".join(segment["text"].strip() for segment in segments)
+        clip["refined_model"] = model_size
+        refined += 1
+    
+    # Write then rename so a crash here leaves the first-pass clips file intact
+    partial_path = clips_json + '.part'
+    with open(partial_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(partial_path, clips_json)
+    
+    model.report()
+    print(f"Refined {refined}/{len(clips)} clips in {format_time(time.time() - refine_start)}")
+    return refined
+
+def open_transcription_cache():
+    """Open the transcription cache, or return None if its directory is unusable"""
+    try:
+        return TranscriptionCache()
+    except OSError as e:
+        print(f"Warning: Transcription cache unavailable: {e}")
+        return None
+
+def cleanup_files(run_completed=False):
+    """Clean up temporary files created during processing
+
+    Files marked with keep_until_complete (decoded audio and checkpoints of a
+    resumable run) survive unless run_completed, so a restart can pick up
+    where the interrupted run stopped.
+    """
     global files_to_cleanup
     print("\nCleaning up temporary files...")
     for file_path in files_to_cleanup:
+        if file_path in resumable_files and not run_completed:
+            print(f"Keeping for resume: {file_path}")
+            continue
         try:
             if os.path.exists(file_path):
                 os.unlink(file_path)
                 print(f"Removed file: {file_path}")
         except Exception as e:
             print(f"Warning: Failed to remove {file_path}: {e}")
+    files_to_cleanup.clear()
+    resumable_files.clear()
+
+def keep_until_complete(*file_paths):
+    """Register files that cleanup must keep until the run completes"""
+    for file_path in file_paths:
+        if file_path not in files_to_cleanup:
+            files_to_cleanup.append(file_path)
+        resumable_files.add(file_path)
 
 # Global list to track files for cleanup
 files_to_cleanup = []
+# Subset of files_to_cleanup needed to resume an interrupted run
+resumable_files = set()
 
-def process_video(video_path, model_size="base"):
-    """Process video to create enhanced transcription"""
+def process_video(video_path, model_size="base", in_memory=False, min_duration=15.0,
+                  stream=False, window_seconds=600.0, overlap_seconds=30.0, workers=1,
+                  model=None, backend='whisper', vad=False, batch_size=1, use_cache=True,
+                  transcript_format='json', candidates=0, candidate_lengths=DEFAULT_WINDOW_LENGTHS):
+    """Process video to create enhanced transcription
+
+    model may be an already loaded backend (e.g. from transcription_server.py);
+    otherwise one is loaded for this run. With use_cache, a transcription of
+    the same decoded audio and settings is reused instead of transcribing.
+    Streaming runs checkpoint every window and resume after an interruption.
+    transcript_format 'ndjson' writes the compact NDJSON + column files
+    instead of the JSON list. candidates > 0 writes that many sliding-window
+    clip candidates instead of min_duration blocks. Returns the transcription path.
+    """
     process_start = time.time()
     device = check_gpu()
     
     video_file = Path(video_path)
-    transcription_path = video_file.with_suffix('.enhanced_transcription.json')
+    transcription_path = transcript_path_for(video_file, transcript_format)
     
     print(f"Processing {video_file.name}...")
     
+    # Everything that changes the transcription output
+    settings = {
+        'model_size': model_size,
+        'backend': backend,
+        'min_duration': min_duration,
+        'vad': vad,
+        'batch_size': batch_size,
+        'stream': stream,
+        'window_seconds': window_seconds if stream else None,
+        'overlap_seconds': overlap_seconds if stream else None,
+        'workers': workers,
+        'transcript_format': transcript_format,
+        'candidates': candidates,
+        'candidate_lengths': [float(length) for length in candidate_lengths] if candidates else None
+    }
+    checkpoint = None
+    run_completed = False
+    
     try:
-        audio_path = extract_audio(video_path)
+        if stream and workers <= 1:
+            # Checkpointed segments are not combined yet, so only what shapes the raw segments must match
+            checkpoint = TranscriptionCheckpoint(video_path, {
+                key: settings[key] for key in
+                ('model_size', 'backend', 'vad', 'batch_size', 'window_seconds', 'overlap_seconds')
+            })
+            keep_until_complete(str(video_file.with_suffix('.f32')), *checkpoint.paths)
+            saved_state = checkpoint.load()
+            audio_path = decode_audio(video_path, reuse_bytes=saved_state and saved_state.get('audio_bytes'))
+            if saved_state is not None and saved_state.get('audio_bytes') != audio_path.nbytes:
+                print("Decoded audio changed since the checkpoint, starting over")
+                checkpoint.clear()
+            # Saved with every window so a restart knows the buffer on disk is complete
+            checkpoint.audio_bytes = audio_path.nbytes
+        elif in_memory or stream or workers > 1 or vad or batch_size > 1:
+            audio_path = decode_audio(video_path)
+        else:
+            audio_path = extract_audio(video_path)
         
-        print(f"Loading Whisper {model_size} model...")
-        model = whisper.load_model(model_size)
-        if device == "cuda":
-            model = model.cuda()
+        cache = open_transcription_cache() if use_cache else None
+        if cache is not None:
+            audio_file = audio_path.filename if isinstance(audio_path, np.ndarray) else audio_path
+            cache_key = TranscriptionCache.make_key(audio_file, **settings)
+            if cache.get(cache_key, transcription_path):
+                print(f"Transcription cache hit ({cache_key[:12]}), skipping transcription")
+                if transcript_format == 'ndjson':
+                    transcript_store.rebuild_columns(transcription_path)
+                print(f"Enhanced transcription saved to {transcription_path}")
+                run_completed = True
+                return transcription_path
         
-        enhanced_transcription = transcribe_with_features(model, audio_path, device)
+        if workers > 1:
+            # Worker processes load their own CPU models
+            enhanced_transcription = transcribe_parallel_with_features(
+                audio_path, model_size, workers, min_duration, backend, vad, batch_size,
+                candidates, candidate_lengths
+            )
+            write_transcript(enhanced_transcription, transcription_path, transcript_format)
+        else:
+            if model is None:
+                model = load_backend(backend, model_size, device)
+            model.reset_stats()
+            
+            if stream:
+                segments = stream_transcribe_with_features(
+                    model, audio_path, device, window_seconds, overlap_seconds, vad, batch_size, checkpoint
+                )
+                count = write_transcript(
+                    combine_for_ranking(segments, min_duration, None, candidates, candidate_lengths),
+                    transcription_path, transcript_format
+                )
+                print(f"Wrote {count} combined segments")
+            else:
+                enhanced_transcription = transcribe_with_features(
+                    model, audio_path, device, min_duration, vad, batch_size,
+                    candidates, candidate_lengths
+                )
+                write_transcript(enhanced_transcription, transcription_path, transcript_format)
+            
+            model.report()
         
-        with open(transcription_path, 'w', encoding='utf-8') as f:
-            json.dump(enhanced_transcription, f, indent=2, ensure_ascii=False)
+        if cache is not None:
+            try:
+                cache.put(cache_key, transcription_path)
+            except OSError as e:
+                print(f"Warning: Failed to cache transcription: {e}")
         
         process_end = time.time()
         print(f"Total processing time: {format_time(process_end - process_start)}")
         print(f"Enhanced transcription saved to {transcription_path}")
         
+        run_completed = True
+        return transcription_path
+        
     except Exception as e:
         print(f"Error processing video: {str(e)}")
         raise
     finally:
-        # Clean up the audio file even if there was an error
-        cleanup_files()
+        # Clean up the audio file even if there was an error, unless a resume needs it
+        cleanup_files(run_completed)
 
 def main():
     parser = argparse.ArgumentParser(description='Create enhanced transcription with audio features')
@@ -258,16 +905,90 @@ def main():
     parser.add_argument('--model', default='base', 
                       choices=['tiny', 'base', 'small', 'medium', 'large', 'turbo'],
                       help='Whisper model size to use')
+    parser.add_argument('--backend', default='whisper', choices=BACKENDS,
+                      help='Inference engine: whisper (PyTorch), whisper-int8 (quantized PyTorch, CPU) '
+                           'or faster-whisper (CTranslate2, int8 on CPU)')
     parser.add_argument('--min-duration', type=float, default=15.0,
                       help='Minimum duration in seconds for combined segments')
+    parser.add_argument('--candidates', type=int, default=0,
+                      help='Write the N best non-overlapping sliding-window candidates instead of '
+                           '--min-duration blocks (0 keeps the blocks)')
+    parser.add_argument('--candidate-lengths', type=float, nargs='+', default=list(DEFAULT_WINDOW_LENGTHS),
+                      help='Window lengths in seconds tried at every segment start with --candidates')
+    parser.add_argument('--in-memory', action='store_true',
+                      help='Decode audio once into a shared float32 buffer instead of a temp WAV')
+    parser.add_argument('--stream', action='store_true',
+                      help='Transcribe in overlapping windows with bounded memory, writing segments as they finish')
+    parser.add_argument('--workers', type=int, default=1,
+                      help='Transcribe silence-aligned shards in N CPU processes, one model each')
+    parser.add_argument('--vad', action='store_true',
+                      help='Skip silence and steady music (e.g. intermissions) with a level and ZCR based voice activity pre-pass')
+    parser.add_argument('--batch-size', type=int, default=1,
+                      help='Decode this many 30 second windows per forward pass (more memory, more throughput)')
+    parser.add_argument('--refine-clips', metavar='TOP_CLIPS_JSON',
+                      help='Two-pass mode: re-transcribe only the clips in this ranked JSON with --model')
+    parser.add_argument('--format', dest='transcript_format', default='json', choices=['json', 'ndjson'],
+                      help='json: indented list (what gpu_clip.py has always read); '
+                           'ndjson: compact streamable lines plus a .npy column file')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='Always transcribe, ignoring and not updating the transcription cache')
+    parser.add_argument('--no-server', action='store_true',
+                      help='Always load the model in-process instead of using a running transcription_server.py')
+    parser.add_argument('--window', type=float, default=600.0,
+                      help='Window length in seconds for --stream')
+    parser.add_argument('--overlap', type=float, default=30.0,
+                      help='Overlap in seconds between --stream windows')
     
     args = parser.parse_args()
     
+    if args.refine_clips:
+        try:
+            refine_clips(args.video_path, args.refine_clips, model_size=args.model, backend=args.backend)
+        except Exception as e:
+            print(f"Failed to refine clips: {str(e)}")
+            sys.exit(1)
+        return
+    
+    # Hand the job to a warm model server when one is running
+    if not args.no_server and args.workers <= 1 and try_server_transcription(
+        args.video_path,
+        model_size=args.model,
+        backend=args.backend,
+        in_memory=args.in_memory,
+        min_duration=args.min_duration,
+        stream=args.stream,
+        window_seconds=args.window,
+        overlap_seconds=args.overlap,
+        vad=args.vad,
+        batch_size=args.batch_size,
+        use_cache=not args.no_cache,
+        transcript_format=args.transcript_format,
+        candidates=args.candidates,
+        candidate_lengths=args.candidate_lengths
+    ):
+        return
+    
     # Register cleanup function to run at exit
     atexit.register(cleanup_files)
     
     try:
-        process_video(args.video_path, model_size=args.model)
+        process_video(
+            args.video_path,
+            model_size=args.model,
+            backend=args.backend,
+            in_memory=args.in_memory,
+            min_duration=args.min_duration,
+            stream=args.stream,
+            window_seconds=args.window,
+            overlap_seconds=args.overlap,
+            workers=args.workers,
+            vad=args.vad,
+            batch_size=args.batch_size,
+            use_cache=not args.no_cache,
+            transcript_format=args.transcript_format,
+            candidates=args.candidates,
+            candidate_lengths=args.candidate_lengths
+        )
     except Exception as e:
         print(f"Failed to process video: {str(e)}")
         sys.exit(1)
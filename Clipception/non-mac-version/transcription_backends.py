@@ -0,0 +1,348 @@
+"""
+Speech-to-text backends for transcription.py
+Every backend returns Whisper-style results ({"segments": [{"start", "end", "text"}, ...]})
+so the feature and combining code doesn't care which engine produced them.
+"""
+
+import time
+
+import numpy as np
+
+BACKENDS = ['whisper', 'whisper-int8', 'faster-whisper']
+
+# Whisper works on 16 kHz mono audio in 30 second windows
+SAMPLE_RATE = 16000
+WINDOW_SECONDS = 30
+
+def import_openai_whisper():
+    """Import OpenAI's whisper package, trying the layouts it has been installed under"""
+    try:
+        import openai.whisper as whisper
+        return whisper
+    except ImportError:
+        pass
+
+    try:
+        from openai import whisper
+        return whisper
+    except ImportError:
+        pass
+
+    try:
+        import whisper
+    except ImportError:
+        whisper = None
+
+    # Other packages named "whisper" exist; make sure this is OpenAI's
+    if whisper is None or not hasattr(whisper, 'load_model'):
+        raise ImportError(
+            "Cannot import OpenAI's Whisper. Install it with: "
+            "pip install git+https://github.com/openai/whisper.git"
+        )
+    return whisper
+
+def audio_duration(audio):
+    """Length in seconds of a 16 kHz sample buffer or an audio file"""
+    if isinstance(audio, np.ndarray):
+        return len(audio) / SAMPLE_RATE
+    import soundfile as sf
+    return sf.info(str(audio)).duration
+
+def split_windows(audio, max_seconds=WINDOW_SECONDS, search_seconds=5.0, frame_seconds=0.1):
+    """Cut a sample buffer into independent (start, end) windows of at most max_seconds
+
+    Each cut lands on the quietest frame in the last search_seconds of the
+    window so words are rarely split between two windows.
+    """
+    total_samples = len(audio)
+    max_samples = int(max_seconds * SAMPLE_RATE)
+    search = int(search_seconds * SAMPLE_RATE)
+    frame = int(frame_seconds * SAMPLE_RATE)
+    windows = []
+    start = 0
+
+    while total_samples - start > max_samples:
+        lo = start + max_samples - search
+        region = np.asarray(audio[lo:start + max_samples], dtype=np.float32)
+        n_frames = len(region) // frame
+        energy = np.square(region[:n_frames * frame]).reshape(n_frames, frame).mean(axis=1)
+        cut = lo + (int(np.argmin(energy)) + 1) * frame
+        windows.append((start, cut))
+        start = cut
+
+    if start < total_samples:
+        windows.append((start, total_samples))
+    return windows
+
+class TranscriptionBackend:
+    """Base class timing every call so backends can be compared by real-time factor"""
+
+    name = None
+
+    def __init__(self, model_size, device="cpu"):
+        self.model_size = model_size
+        self.device = device
+        self.audio_seconds = 0.0
+        self.compute_seconds = 0.0
+
+    def reset_stats(self):
+        """Start a new real-time factor measurement"""
+        self.audio_seconds = 0.0
+        self.compute_seconds = 0.0
+
+    def transcribe(self, audio, language=None, initial_prompt=None, batch_size=1, batched=None, **options):
+        """Transcribe a 16 kHz float32 buffer or an audio file path
+
+        batch_size > 1 decodes that many independent 30 second windows per
+        forward pass where the backend supports it. batched=True takes that
+        independent-window path even at batch_size 1, so batch sizes can be
+        compared like for like.
+        """
+        if batched is None:
+            batched = batch_size > 1
+        start = time.time()
+        if batched and isinstance(audio, np.ndarray):
+            result = self._transcribe_batched(audio, batch_size, language=language,
+                                              initial_prompt=initial_prompt, **options)
+        else:
+            result = self._transcribe(audio, language=language, initial_prompt=initial_prompt, **options)
+        self.compute_seconds += time.time() - start
+        self.audio_seconds += audio_duration(audio)
+        return result
+
+    def _transcribe(self, audio, language=None, initial_prompt=None, **options):
+        raise NotImplementedError
+
+    def _transcribe_batched(self, audio, batch_size, language=None, initial_prompt=None, **options):
+        print(f"Backend {self.name} has no batched decoding; transcribing sequentially")
+        return self._transcribe(audio, language=language, initial_prompt=initial_prompt, **options)
+
+    @property
+    def real_time_factor(self):
+        """Compute time divided by audio time; below 1.0 is faster than real time"""
+        if not self.audio_seconds:
+            return 0.0
+        return self.compute_seconds / self.audio_seconds
+
+    def report(self):
+        """Print throughput for the audio transcribed so far"""
+        print(f"Backend {self.name} ({self.model_size}, {self.device}): "
+              f"{self.audio_seconds:.1f}s of audio in {self.compute_seconds:.1f}s, "
+              f"real-time factor {self.real_time_factor:.3f}")
+
+class OpenAIWhisperBackend(TranscriptionBackend):
+    """OpenAI's reference PyTorch implementation"""
+
+    name = 'whisper'
+
+    def __init__(self, model_size, device="cpu", cpu_threads=None):
+        super().__init__(model_size, device)
+        self.whisper = import_openai_whisper()
+        if cpu_threads:
+            import torch
+            torch.set_num_threads(cpu_threads)
+        self.model = self.whisper.load_model(model_size, device=device)
+        self.fp16 = device == "cuda"
+
+    def _transcribe(self, audio, language=None, initial_prompt=None, **options):
+        return self.model.transcribe(audio, language=language, initial_prompt=initial_prompt, **options)
+
+    def _transcribe_batched(self, audio, batch_size, language=None, initial_prompt=None, **options):
+        """Encode and decode batch_size windows together
+
+        Unlike transcribe(), windows don't condition on each other's text and
+        there is no temperature fallback; that independence is what lets
+        them share a forward pass.
+        """
+        import torch
+        whisper = self.whisper
+
+        decoding_options = whisper.DecodingOptions(
+            language=language,
+            prompt=initial_prompt,
+            fp16=options.get('fp16', self.fp16) and self.fp16
+        )
+        tokenizer = whisper.tokenizer.get_tokenizer(
+            self.model.is_multilingual,
+            num_languages=getattr(self.model, 'num_languages', 99),
+            language=language,
+            task='transcribe'
+        )
+
+        windows = split_windows(audio)
+        segments = []
+        for first in range(0, len(windows), batch_size):
+            batch = windows[first:first + batch_size]
+            mel = torch.stack([
+                whisper.log_mel_spectrogram(
+                    whisper.pad_or_trim(np.asarray(audio[start:end], dtype=np.float32)),
+                    self.model.dims.n_mels
+                )
+                for start, end in batch
+            ]).to(self.model.device)
+
+            for (start, end), result in zip(batch, whisper.decode(self.model, mel, decoding_options)):
+                segments.extend(self._token_segments(
+                    tokenizer, result.tokens, start / SAMPLE_RATE, (end - start) / SAMPLE_RATE
+                ))
+
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": language
+        }
+
+    @staticmethod
+    def _token_segments(tokenizer, tokens, offset, duration):
+        """Split a window's decoded tokens into segments at its timestamp tokens"""
+        segments = []
+        start = None
+        last_timestamp = 0.0
+        text_tokens = []
+
+        for token in tokens:
+            if token < tokenizer.timestamp_begin:
+                text_tokens.append(token)
+                continue
+            # Timestamp tokens are 20 ms steps from the start of the window
+            timestamp = min((token - tokenizer.timestamp_begin) * 0.02, duration)
+            last_timestamp = timestamp
+            if start is not None and text_tokens:
+                segments.append({"start": start, "end": timestamp, "text": tokenizer.decode(text_tokens)})
+                text_tokens = []
+                start = None
+            else:
+                start = timestamp
+
+        if text_tokens:
+            # Text cut off by the end of the window, with no closing timestamp
+            segments.append({
+                "start": last_timestamp if start is None else start,
+                "end": duration,
+                "text": tokenizer.decode(text_tokens)
+            })
+
+        for segment in segments:
+            segment["start"] += offset
+            segment["end"] += offset
+        return [segment for segment in segments if segment["text"].strip()]
+
+class QuantizedWhisperBackend(OpenAIWhisperBackend):
+    """OpenAI Whisper with its Linear layers dynamically quantized to int8 (CPU only)"""
+
+    name = 'whisper-int8'
+
+    def __init__(self, model_size, device="cpu", cpu_threads=None):
+        if device != "cpu":
+            print("whisper-int8 runs on CPU only; ignoring GPU")
+        super().__init__(model_size, "cpu", cpu_threads)
+        self.fp16 = False
+
+        import torch
+        from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+        from torch.ao.quantization import default_dynamic_qconfig, quantize_dynamic
+
+        # Whisper builds its layers from whisper.model.Linear, which quantize_dynamic skips
+        # (it matches exact types) and DynamicQuantizedLinear.from_float rejects, so swap
+        # them for plain nn.Linear layers sharing the same weights first
+        self._replace_whisper_linears(self.model, self.whisper.model.Linear)
+        self.model = quantize_dynamic(
+            self.model,
+            qconfig_spec={torch.nn.Linear: default_dynamic_qconfig},
+            mapping={torch.nn.Linear: DynamicQuantizedLinear},
+            dtype=torch.qint8
+        )
+        if not any(isinstance(module, DynamicQuantizedLinear) for module in self.model.modules()):
+            raise RuntimeError("whisper-int8: quantization left no int8 Linear layers in the model")
+
+    @staticmethod
+    def _replace_whisper_linears(module, whisper_linear):
+        """Swap every whisper.model.Linear under module for an nn.Linear with the same parameters"""
+        import torch
+        for name, child in module.named_children():
+            if isinstance(child, whisper_linear):
+                linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+                linear.weight = child.weight
+                if child.bias is not None:
+                    linear.bias = child.bias
+                setattr(module, name, linear)
+            else:
+                QuantizedWhisperBackend._replace_whisper_linears(child, whisper_linear)
+
+    def _transcribe(self, audio, language=None, initial_prompt=None, **options):
+        options['fp16'] = False
+        return super()._transcribe(audio, language=language, initial_prompt=initial_prompt, **options)
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """CTranslate2 engine from faster-whisper, int8 on CPU and float16 on GPU"""
+
+    name = 'faster-whisper'
+
+    # faster-whisper names for the openai-whisper sizes that differ
+    MODEL_NAMES = {'large': 'large-v3', 'turbo': 'large-v3-turbo'}
+
+    def __init__(self, model_size, device="cpu", cpu_threads=None):
+        super().__init__(model_size, device)
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise ImportError("faster-whisper is not installed. Install it with: pip install faster-whisper")
+
+        compute_type = "float16" if device == "cuda" else "int8"
+        self.model = WhisperModel(
+            self.MODEL_NAMES.get(model_size, model_size),
+            device=device,
+            compute_type=compute_type,
+            cpu_threads=cpu_threads or 0
+        )
+
+    def _transcribe(self, audio, language=None, initial_prompt=None, **options):
+        if isinstance(audio, np.ndarray):
+            audio = np.ascontiguousarray(audio, dtype=np.float32)
+        else:
+            audio = str(audio)
+
+        # fp16 and other openai-whisper decode options have no equivalent here
+        segments, info = self.model.transcribe(audio, language=language, initial_prompt=initial_prompt)
+        return self._result(segments, info)
+
+    def _transcribe_batched(self, audio, batch_size, language=None, initial_prompt=None, **options):
+        try:
+            from faster_whisper import BatchedInferencePipeline
+        except ImportError:
+            # Batched inference arrived in faster-whisper 1.1
+            return super()._transcribe_batched(audio, batch_size, language, initial_prompt, **options)
+
+        pipeline = BatchedInferencePipeline(model=self.model)
+        segments, info = pipeline.transcribe(
+            np.ascontiguousarray(audio, dtype=np.float32),
+            language=language,
+            initial_prompt=initial_prompt,
+            batch_size=batch_size
+        )
+        return self._result(segments, info)
+
+    @staticmethod
+    def _result(segments, info):
+        """Convert faster-whisper segments into a Whisper-style result"""
+        segments = [
+            {"start": segment.start, "end": segment.end, "text": segment.text}
+            for segment in segments
+        ]
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": info.language
+        }
+
+BACKEND_CLASSES = {
+    backend.name: backend
+    for backend in (OpenAIWhisperBackend, QuantizedWhisperBackend, FasterWhisperBackend)
+}
+
+def load_backend(name, model_size, device="cpu", cpu_threads=None):
+    """Load a transcription backend by name"""
+    if name not in BACKEND_CLASSES:
+        raise ValueError(f"Unknown transcription backend: {name} (choose from {', '.join(BACKENDS)})")
+    print(f"Loading {name} {model_size} model...")
+    return BACKEND_CLASSES[name](model_size, device, cpu_threads)
@@ -0,0 +1,84 @@
+"""
+Content-addressed cache for enhanced transcriptions
+Entries are keyed by a hash of the decoded audio plus every setting that changes
+the output, so a resubmitted or retried VOD skips transcription entirely no
+matter what the file is called. Least recently used entries are evicted once
+the cache grows past its size limit.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'TRANSCRIPTION_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'clipception', 'transcriptions')
+)
+DEFAULT_MAX_BYTES = int(os.environ.get('TRANSCRIPTION_CACHE_MAX_MB', '2048')) * 1024 * 1024
+
+def hash_audio_file(audio_file, block_size=1 << 20):
+    """SHA-256 of a decoded audio file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(audio_file, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class TranscriptionCache:
+    """Directory of <key>.json transcriptions with LRU eviction by total size"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(audio_file, **settings):
+        """Key for a decoded audio file and the settings that produced its transcription"""
+        settings_json = json.dumps(settings, sort_keys=True)
+        return hashlib.sha256(f"{hash_audio_file(audio_file)}:{settings_json}".encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key, destination):
+        """Copy a cached transcription to destination; return False on a miss"""
+        entry = self._entry_path(key)
+        try:
+            shutil.copyfile(entry, destination)
+        except FileNotFoundError:
+            return False
+        # Touch so eviction sees it as recently used
+        os.utime(entry)
+        return True
+
+    def put(self, key, transcription_path):
+        """Store a finished transcription, then evict down to the size limit"""
+        entry = self._entry_path(key)
+        partial = entry.with_name(entry.name + '.part')
+        shutil.copyfile(transcription_path, partial)
+        os.replace(partial, entry)
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for entry in self.cache_dir.glob('*.json'):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                entry.unlink()
+                total -= size
+                print(f"Evicted cached transcription: {entry.name}")
+            except FileNotFoundError:
+                pass
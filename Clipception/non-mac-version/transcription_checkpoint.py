@@ -0,0 +1,79 @@
+"""
+Checkpoints for resumable streaming transcription
+Enhanced segments from each finished window are appended to an NDJSON file,
+then a small state file records how much of it is committed and where the
+next window starts. A restarted run with the same settings replays the
+committed segments and continues from that offset.
+"""
+
+import json
+import os
+from pathlib import Path
+
+class TranscriptionCheckpoint:
+    """State and segment files kept next to the video until its transcription completes"""
+
+    def __init__(self, video_path, settings):
+        video_file = Path(video_path)
+        self.state_path = video_file.with_suffix('.transcription_state.json')
+        self.segments_path = video_file.with_suffix('.transcription_segments.jsonl')
+        self.settings = settings
+        self.committed_bytes = 0
+        # Size of the decoded audio buffer the checkpoint belongs to
+        self.audio_bytes = None
+
+    @property
+    def paths(self):
+        return [str(self.state_path), str(self.segments_path)]
+
+    def load(self):
+        """Return the saved state for these settings, or None to start from scratch"""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if state.get('settings') != self.settings:
+            print("Checkpoint was written with different settings, starting over")
+            self.clear()
+            return None
+
+        self.committed_bytes = state['committed_bytes']
+        return state
+
+    def load_segments(self):
+        """Read back the committed segments, dropping anything written after the last save"""
+        if self.committed_bytes == 0:
+            return []
+        with open(self.segments_path, 'r+b') as f:
+            f.truncate(self.committed_bytes)
+            f.seek(0)
+            return [json.loads(line) for line in f]
+
+    def save(self, segments, **state):
+        """Commit one window's segments, then atomically record the new state"""
+        mode = 'ab' if self.committed_bytes else 'wb'
+        with open(self.segments_path, mode) as f:
+            for segment in segments:
+                f.write(json.dumps(segment, ensure_ascii=False).encode('utf-8') + b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+            self.committed_bytes = f.tell()
+
+        partial = self.state_path.with_name(self.state_path.name + '.part')
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump({
+                'settings': self.settings,
+                'committed_bytes': self.committed_bytes,
+                'audio_bytes': self.audio_bytes,
+                **state
+            }, f)
+        os.replace(partial, self.state_path)
+
+    def clear(self):
+        """Remove the checkpoint files"""
+        self.committed_bytes = 0
+        for path in (self.state_path, self.segments_path):
+            if path.exists():
+                path.unlink()
@@ -0,0 +1,69 @@
+"""
+Client for the persistent Whisper transcription server (transcription_server.py).
+Uses only the standard library so callers don't pay for importing torch or whisper.
+"""
+
+import json
+import os
+import socket
+
+DEFAULT_SOCKET_PATH = os.environ.get('WHISPER_SERVER_SOCKET', '/tmp/clipception-whisper.sock')
+
+def server_available(socket_path=DEFAULT_SOCKET_PATH):
+    """Check whether a transcription server socket exists"""
+    return hasattr(socket, 'AF_UNIX') and os.path.exists(socket_path)
+
+def send_request(request, socket_path=DEFAULT_SOCKET_PATH):
+    """Send one JSON request to the server and return its JSON response, or None if it isn't running"""
+    if not server_available(socket_path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        # Stale socket file left behind by a server that is no longer running
+        sock.close()
+        return None
+
+    with sock, sock.makefile('rwb') as stream:
+        stream.write(json.dumps(request).encode('utf-8') + b'\n')
+        stream.flush()
+        line = stream.readline()
+
+    if not line:
+        raise RuntimeError("Transcription server closed the connection without a response")
+    return json.loads(line)
+
+def request_transcription(video_path, socket_path=DEFAULT_SOCKET_PATH, **options):
+    """Ask a running server to transcribe video_path
+
+    Returns the path of the enhanced transcription JSON, or None when no
+    server is running. options are passed through to process_video.
+    """
+    response = send_request(
+        {'video_path': os.path.abspath(video_path), **options},
+        socket_path
+    )
+    if response is None:
+        return None
+    if not response.get('ok'):
+        raise RuntimeError(response.get('error', 'unknown transcription server error'))
+    return response['transcription_path']
+
+def try_server_transcription(video_path, **options):
+    """Transcribe through the server if one is running
+
+    Returns False when the caller should fall back to in-process transcription.
+    """
+    try:
+        transcription_path = request_transcription(video_path, **options)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Transcription server failed ({e}), falling back to in-process transcription")
+        return False
+
+    if transcription_path is None:
+        return False
+
+    print(f"Enhanced transcription saved to {transcription_path} (via transcription server)")
+    return True
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Persistent Whisper transcription server
+Keeps models loaded between jobs so transcription.py and the pipeline scripts
+skip the torch import and model load on every run. Clients connect over a
+Unix socket and send one JSON request per connection (see transcription_client.py).
+"""
+
+import argparse
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+
+import transcription
+from transcription_client import DEFAULT_SOCKET_PATH, send_request
+
+# process_video options a client is allowed to set
+ALLOWED_OPTIONS = {
+    'model_size', 'backend', 'min_duration', 'in_memory', 'stream',
+    'window_seconds', 'overlap_seconds', 'vad', 'batch_size', 'use_cache', 'transcript_format',
+    'candidates', 'candidate_lengths'
+}
+
+class TranscriptionHandler(socketserver.StreamRequestHandler):
+    """Read one JSON request, run it and write back one JSON response"""
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            if request.get('command') == 'status':
+                response = {'ok': True, 'models': sorted(self.server.models)}
+            else:
+                response = self.server.transcribe(request)
+        except Exception as e:
+            print(f"Request failed: {str(e)}")
+            response = {'ok': False, 'error': str(e)}
+
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+class TranscriptionServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server owning a set of warm models, keyed by backend and size"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, preload=(), backend='whisper'):
+        self.device = transcription.check_gpu()
+        self.models = {}
+        # Jobs share the models and transcription's cleanup list, so run one at a time
+        self.job_lock = threading.Lock()
+
+        for model_size in preload:
+            self.get_model(model_size, backend)
+
+        super().__init__(socket_path, TranscriptionHandler)
+
+    def get_model(self, model_size, backend='whisper'):
+        """Return a loaded model, loading it on first use"""
+        key = f"{backend}:{model_size}"
+        if key not in self.models:
+            self.models[key] = transcription.load_backend(backend, model_size, self.device)
+        return self.models[key]
+
+    def transcribe(self, request):
+        """Run process_video for a request using a warm model"""
+        video_path = request.get('video_path')
+        if not video_path or not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file not found: {video_path}")
+
+        unknown = set(request) - ALLOWED_OPTIONS - {'video_path'}
+        if unknown:
+            raise ValueError(f"Unsupported options: {', '.join(sorted(unknown))}")
+
+        options = {key: request[key] for key in ALLOWED_OPTIONS if key in request}
+        model_size = options.get('model_size', 'base')
+        backend = options.get('backend', 'whisper')
+
+        with self.job_lock:
+            model = self.get_model(model_size, backend)
+            transcription_path = transcription.process_video(video_path, model=model, **options)
+
+        return {'ok': True, 'transcription_path': str(transcription_path)}
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve Whisper transcription with models kept in memory')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET_PATH,
+                      help=f'Unix socket path (default: {DEFAULT_SOCKET_PATH}, or $WHISPER_SERVER_SOCKET)')
+    parser.add_argument('--preload', nargs='*', default=['base'],
+                      choices=['tiny', 'base', 'small', 'medium', 'large', 'turbo'],
+                      help='Models to load at startup; others are loaded on first request')
+    parser.add_argument('--backend', default='whisper', choices=transcription.BACKENDS,
+                      help='Backend for the preloaded models')
+
+    args = parser.parse_args()
+
+    if os.path.exists(args.socket):
+        if send_request({'command': 'status'}, args.socket) is not None:
+            print(f"A transcription server is already listening on {args.socket}")
+            sys.exit(1)
+        # Left over from a server that didn't shut down cleanly
+        os.unlink(args.socket)
+
+    server = TranscriptionServer(args.socket, args.preload, args.backend)
+    print(f"Transcription server listening on {args.socket} with models: {', '.join(sorted(server.models)) or 'none'}")
+
+    # Treat SIGTERM (e.g. a deploy restarting the worker) like Ctrl+C so the socket is removed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down transcription server...")
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+if __name__ == "__main__":
+    main()